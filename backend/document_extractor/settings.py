@@ -121,12 +121,147 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+# Cache for document list/detail payloads and their version stamps. It must
+# be shared by every worker, or one process keeps serving payloads another has
+# invalidated, so the default is a file-based cache under BASE_DIR. Point
+# DJANGO_CACHE_DIR at a directory all workers can reach (or configure a
+# networked backend) when they run on more than one machine.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', str(BASE_DIR / 'cache')),
+        # The file backend lists the whole directory on every write past
+        # MAX_ENTRIES and then deletes a random 1/CULL_FREQUENCY of the files.
+        # Room for roughly 2 payloads and 2 version stamps per active document;
+        # a culled version stamp is recreated newer, so culling never serves
+        # stale data.
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('DJANGO_CACHE_MAX_ENTRIES', 20000)),
+            'CULL_FREQUENCY': 4,
+        },
+    }
+}
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Uploaded documents use a content-addressed, sharded layout. Set
+# DOCUMENT_S3_BUCKET (and DOCUMENT_S3_ENDPOINT_URL for MinIO or other
+# S3-compatible services) to keep them in object storage instead.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'documents': {
+        'BACKEND': 'extraction.storage.ShardedFileSystemStorage',
+    },
+}
+if os.environ.get('DOCUMENT_S3_BUCKET'):
+    STORAGES['documents'] = {
+        'BACKEND': 'extraction.storage.S3CompatibleStorage',
+        'OPTIONS': {
+            'bucket_name': os.environ['DOCUMENT_S3_BUCKET'],
+            'endpoint_url': os.environ.get('DOCUMENT_S3_ENDPOINT_URL'),
+            'access_key': os.environ.get('DOCUMENT_S3_ACCESS_KEY'),
+            'secret_key': os.environ.get('DOCUMENT_S3_SECRET_KEY'),
+            'region_name': os.environ.get('DOCUMENT_S3_REGION'),
+            'location': os.environ.get('DOCUMENT_S3_PREFIX', ''),
+        },
+    }
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 
 # Optionally, these help with static files management:
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+
+# Chunked / resumable uploads
+UPLOAD_STAGING_DIR = BASE_DIR / 'media' / 'uploads'
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # Largest chunk accepted per append request
+MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+# Unfinished or failed uploads older than this are removed by `manage.py purge_uploads`
+UPLOAD_SESSION_MAX_AGE = 24 * 60 * 60
+
+# Prometheus scrape endpoint (/metrics). Served to these client addresses,
+# and to any request with "Authorization: Bearer <METRICS_TOKEN>" when a
+# token is set. Behind a reverse proxy REMOTE_ADDR is the proxy's address, so
+# use the token there.
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Inference server (python manage.py run_inference_server). When set, web
+# workers send model calls there and never load the models themselves.
+INFERENCE_SERVER_URL = os.environ.get('INFERENCE_SERVER_URL')
+INFERENCE_SERVER_TIMEOUT = int(os.environ.get('INFERENCE_SERVER_TIMEOUT', 300))
+
+# Micro-batching in front of each model pipeline: concurrent requests are
+# collected for up to max_wait_ms or max_batch_size inputs and run as one
+# forward pass. Per-pipeline overrides go under 'pipelines', e.g.
+# {'qa': {'max_batch_size': 16}}.
+INFERENCE_BATCHING = {
+    'enabled': os.environ.get('INFERENCE_BATCHING', '1') != '0',
+    'max_batch_size': int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 8)),
+    'max_wait_ms': float(os.environ.get('INFERENCE_MAX_WAIT_MS', 5)),
+    'pipelines': {},
+}
+
+# Thread pools for PDF parsing and model calls, shared by the sync and async
+# views (extraction/executors.py). Waiting work is served round-robin across
+# users; past max_workers + max_queue tasks, or max_queue_per_user waiting
+# tasks for one user, requests are refused with 503 and Retry-After.
+PROCESSING_EXECUTORS = {
+    'pdf_parse': {'max_workers': 4, 'max_queue': 64, 'max_queue_per_user': 16, 'retry_after': 2},
+    'inference': {'max_workers': 4, 'max_queue': 32, 'max_queue_per_user': 8, 'retry_after': 5},
+    # Background answer-cache prefill; uploads past the queue skip prefill.
+    'answer_prefill': {'max_workers': 1, 'max_queue': 16},
+}
+
+# Cost-aware per-user quotas (extraction/throttling.py). Each user has a token
+# bucket holding up to 'capacity' cost units, refilled at 'refill_per_second';
+# requests are charged what they cost to serve and refused with 429 and
+# Retry-After when the bucket runs dry.
+EXTRACTION_QUOTA = {
+    'capacity': float(os.environ.get('EXTRACTION_QUOTA_CAPACITY', 300)),
+    'refill_per_second': float(os.environ.get('EXTRACTION_QUOTA_REFILL_PER_SECOND', 1)),
+}
+EXTRACTION_COSTS = {
+    'invoice': 3,  # regex fields + NER on the first 512 chars
+    'resume': 3,  # regex fields + NER on the first 512 chars
+    'research_paper': 10,  # regex fields + BART summarization
+    'auto': 10,  # charged as the costliest type the classifier can pick
+    'other': 60,  # LLM custom extraction
+    'question': 1,  # per question, extractive QA
+    'export': 5,
+}
+
+# First-page document type classifier; weights from `manage.py train_classifier`.
+# Unset uses extraction/classifier_weights.json.
+CLASSIFIER_WEIGHTS_PATH = os.environ.get('CLASSIFIER_WEIGHTS_PATH')
+# 'auto' uploads classified with less confidence are sent back for the user
+# to choose a type. Out-of-scope documents (NDAs, leases, letters) score
+# 0.47-0.70 with the shipped weights; real invoices, resumes and papers 0.92+.
+CLASSIFIER_MIN_CONFIDENCE = float(os.environ.get('CLASSIFIER_MIN_CONFIDENCE', 0.8))
+
+# Batch Q&A
+MAX_QUESTIONS_PER_REQUEST = 50
+
+# Result export: rows fetched from the database per chunk
+EXPORT_CHUNK_SIZE = 2000
+
+# QA answer cache. Bump QA_MODEL_VERSION when the QA model changes so
+# cached answers from the old model are no longer served.
+QA_MODEL_VERSION = os.environ.get('QA_MODEL_VERSION', 'deepset/roberta-base-squad2')
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', 100000))
+# Rows stored between eviction passes, so the cap can be overshot by this much per worker.
+ANSWER_CACHE_EVICT_INTERVAL = int(os.environ.get('ANSWER_CACHE_EVICT_INTERVAL', 1000))
+# Answered in the background after each upload so the first ask is a cache hit.
+ANSWER_CACHE_PREFILL_QUESTIONS = {
+    'invoice': ['What is the invoice number?', 'What is the total amount?', 'Who is the vendor?', 'What is the due date?'],
+    'resume': ['What is the candidate\'s name?', 'What is the email address?', 'What is the most recent job title?'],
+    'research_paper': ['What is the title?', 'Who are the authors?', 'What is the main contribution?'],
+}
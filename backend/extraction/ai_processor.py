@@ -1,77 +1,240 @@
-import fitz  # PyMuPDF
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from PIL import Image
 import io
 import time
 import logging
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, List, Optional
 import re
 import json
-import numpy as np
-# Add to top of file
-from llama_cpp import Llama
 import os
 
+from .batching import enable_batching
+from .metrics import LLM_TOKENS_PER_SECOND, model_call, model_load, record_cache_lookup, stage
+from .pdf import DocumentPages, extract_text
+from .schemas import (
+    CustomExtractionData,
+    ExtractionFailure,
+    InvoiceData,
+    QAAnswer,
+    ResearchPaperData,
+    ResumeData,
+)
+
 
 # Load Mistral GGUF model path from environment variable or use default
 DEFAULT_MODEL_PATH = "models/mistral/mistral-7b-instruct-v0.1.Q4_K_M.gguf"
 MODEL_PATH = os.environ.get("MISTRAL_MODEL_PATH", DEFAULT_MODEL_PATH)
 
 def get_llama_model():
-    if not hasattr(get_llama_model, "llm"):
+    cached = hasattr(get_llama_model, "llm")
+    record_cache_lookup('mistral_model', cached)
+    if not cached:
         if not os.path.exists(MODEL_PATH):
             raise FileNotFoundError(f"Mistral model not found at {MODEL_PATH}")
-        get_llama_model.llm = Llama(
-            model_path=MODEL_PATH,
-            n_ctx=4096,
-            n_threads=8,     # You have 4 cores / 8 threads (i3), use max
-            n_gpu_layers=0,  # CPU inference
-            verbose=False
-        )
+        # Imported here so only the custom-prompt path pays for llama.cpp.
+        from llama_cpp import Llama
+
+        with model_load('mistral'):
+            get_llama_model.llm = Llama(
+                model_path=MODEL_PATH,
+                n_ctx=4096,
+                n_threads=8,     # You have 4 cores / 8 threads (i3), use max
+                n_gpu_layers=0,  # CPU inference
+                verbose=False
+            )
     return get_llama_model.llm
 
 
 logger = logging.getLogger(__name__)
 
-def make_json_serializable(data):
-    if isinstance(data, dict):
-        return {k: make_json_serializable(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [make_json_serializable(item) for item in data]
-    elif isinstance(data, np.integer):
-        return int(data)
-    elif isinstance(data, np.floating):
-        return float(data)
-    elif isinstance(data, np.ndarray):
-        return data.tolist()
-    return data
+# Patterns of the fields below that are read with several patterns in
+# priority order, or that settle with a custom check.
+INVOICE_NUMBER_PATTERNS = [
+    r'invoice\s*#?\s*:?\s*([A-Z0-9-]+)',
+    r'inv\s*#?\s*:?\s*([A-Z0-9-]+)',
+    r'#\s*([A-Z0-9-]+)'
+]
+DATE_PATTERNS = [
+    r'\b(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\b',
+    r'\b(\d{4}[/-]\d{1,2}[/-]\d{1,2})\b',
+    r'\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2},?\s+\d{4}\b'
+]
+TOTAL_AMOUNT_PATTERNS = [
+    r'total\s*:?\s*\$?(\d+\.?\d*)',
+    r'amount\s*:?\s*\$?(\d+\.?\d*)',
+    r'\$(\d+\.?\d*)'
+]
+PHONE_PATTERNS = [
+    r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
+    r'\(\d{3}\)\s*\d{3}[-.]?\d{4}'
+]
+ABSTRACT_RE = re.compile(r'abstract\s*:?\s*(.*?)(?=\n\n|\nkeywords|\nintroduction)', re.IGNORECASE | re.DOTALL)
+KEYWORDS_RE = re.compile(r'keywords?\s*:?\s*(.*?)(?=\n\n|\nintroduction)', re.IGNORECASE)
+SECTION_RE = re.compile(r'\n([A-Z][A-Za-z\s]+)\n')
+
+# Where each field is found, so extraction parses only the pages it needs:
+#   (HEADER, n)    the first n lines
+#   FIRST          the first pages, one more at a time, until the value is settled
+#   (FIRST, n)     likewise, until n items are found
+#   LAST           the last pages, one more at a time, until the value is settled
+#   ALL            the whole document
+# A value found in part of the document is settled only when reading more
+# pages could not change it (see FIELD_SETTLED); until then the scan goes
+# on, up to the whole document, so lazy results equal full-text ones.
+# Page texts end in a newline, so lines never run across pages.
+HEADER, FIRST, LAST, ALL = 'header', 'first', 'last', 'all'
+
+FIELD_SCOPES = {
+    'invoice': {
+        'invoice_number': FIRST,
+        'date': FIRST,
+        'vendor_name': (HEADER, 5),
+        'total_amount': LAST,
+        'line_items': (FIRST, 10),
+    },
+    'resume': {
+        'name': (HEADER, 3),
+        'email': FIRST,
+        'phone': FIRST,
+        'education': (FIRST, 5),
+        'experience': (FIRST, 5),
+        'skills': ALL,
+    },
+    'research_paper': {
+        'title': (HEADER, 5),
+        'authors': (HEADER, 10),
+        'abstract': FIRST,
+        'keywords': FIRST,
+        'sections': (FIRST, 10),
+    },
+}
+
+
+def _top_pattern_matched(patterns, flags=0):
+    """
+    Settled once the highest-priority pattern matches: a lower one matching
+    in the pages read so far could still lose to the top one further on.
+    """
+    top = re.compile(patterns[0], flags)
+    return lambda text, value: top.search(text) is not None
+
+
+def _first_occurrence_matched(pattern, word):
+    """
+    Settled once `pattern` matches at the first occurrence of `word`, where
+    a search of the whole document would match too.
+    """
+    word = re.compile(word, re.IGNORECASE)
+
+    def settled(text, value):
+        match = pattern.search(text)
+        return match is not None and match.start() == word.search(text).start()
+    return settled
+
+
+def _sections_settled(text, value):
+    """
+    The first ten headers are final once the text after the tenth one holds
+    a character no header can contain, which ends its greedy match.
+    """
+    if len(value) < 10:
+        return False
+    tenth = [match for _, match in zip(range(10), SECTION_RE.finditer(text))][-1]
+    return re.search(r'[^A-Za-z\s]', text[tenth.start(1):]) is not None
+
+
+FIELD_SETTLED = {
+    'invoice_number': _top_pattern_matched(INVOICE_NUMBER_PATTERNS, re.IGNORECASE),
+    'date': _top_pattern_matched(DATE_PATTERNS, re.IGNORECASE),
+    'total_amount': _top_pattern_matched(TOTAL_AMOUNT_PATTERNS, re.IGNORECASE),
+    'phone': _top_pattern_matched(PHONE_PATTERNS),
+    'abstract': _first_occurrence_matched(ABSTRACT_RE, 'abstract'),
+    'keywords': _first_occurrence_matched(KEYWORDS_RE, 'keyword'),
+    'sections': _sections_settled,
+}
+
+
+def _scan(pages, extract, scope, settled=None):
+    """Run `extract` over as few pages as `scope` allows."""
+    limit = None
+    if isinstance(scope, tuple):
+        scope, limit = scope
+    if scope == ALL:
+        return extract(pages.text)
+    if settled is None:
+        if scope == HEADER:
+            settled = lambda text, value: text.count('\n') >= limit
+        elif limit is not None:
+            settled = lambda text, value: len(value) >= limit
+        else:
+            settled = lambda text, value: value not in (None, [])
+    value = None
+    for text in (pages.suffixes() if scope == LAST else pages.prefixes()):
+        value = extract(text)
+        if settled(text, value):
+            break
+    return value if value is not None else extract("")
+
+
+def _softmax(logits):
+    import numpy as np
+
+    probs = np.exp(logits - logits.max())
+    return probs / probs.sum()
+
+
+def _word_span(encoding, offsets, start, end):
+    """Character span of the whole words covering tokens `start`..`end`."""
+    try:
+        return (encoding.word_to_chars(encoding.token_to_word(start))[0],
+                encoding.word_to_chars(encoding.token_to_word(end))[1])
+    except Exception:
+        # Slow tokenizers have no word alignment; use the token offsets.
+        return offsets[start][0], offsets[end][1]
+
 
 class DocumentProcessor:
+    def __init__(self, models=None):
+        """
+        Load the default pipelines, or use the given `models` dict instead
+        (benchmarks and tests pass small stand-ins so nothing is downloaded).
+        """
+        self._device = None
+        self.models = {}
+        if models is not None:
+            self.models.update(models)
+        else:
+            self._load_models()
+
+    @property
+    def device(self):
+        if self._device is None:
+            import torch
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        return self._device
+
+    def _load_pipeline(self, name, task, model):
+        # torch and transformers load with the first pipeline, not with this module.
+        from transformers import pipeline
+
+        with model_load(name):
+            return pipeline(task, model=model, device=0 if self.device == "cuda" else -1)
+
     def _load_models(self):
         try:
-            self.models['invoice'] = pipeline(
-                "token-classification",
-                model="dbmdz/bert-large-cased-finetuned-conll03-english",
-                device=0 if self.device == "cuda" else -1
+            self.models['invoice'] = self._load_pipeline(
+                'invoice', "token-classification", "dbmdz/bert-large-cased-finetuned-conll03-english"
             )
-            self.models['resume'] = pipeline(
-                "token-classification",
-                model="dbmdz/bert-large-cased-finetuned-conll03-english",
-                device=0 if self.device == "cuda" else -1
+            self.models['resume'] = self._load_pipeline(
+                'resume', "token-classification", "dbmdz/bert-large-cased-finetuned-conll03-english"
             )
-            self.models['research_paper'] = pipeline(
-                "summarization",
-                model="facebook/bart-large-cnn",
-                device=0 if self.device == "cuda" else -1
+            self.models['research_paper'] = self._load_pipeline(
+                'research_paper', "summarization", "facebook/bart-large-cnn"
             )
             self.models['other'] = None  # placeholder
             # Add QA pipeline for open-ended Q&A
             try:
-                self.models['qa'] = pipeline(
-                    "question-answering",
-                    model="deepset/roberta-base-squad2",
-                    device=0 if self.device == "cuda" else -1
+                self.models['qa'] = self._load_pipeline(
+                    'qa', "question-answering", "deepset/roberta-base-squad2"
                 )
             except Exception as e:
                 logger.error(f"Error loading QA model: {e}")
@@ -86,43 +249,136 @@ class DocumentProcessor:
         if not self.models.get('qa'):
             return {"error": "QA model not available"}
         try:
-            result = self.models['qa']({"context": text, "question": question})
-            return {
-                "question": question,
-                "answer": result.get("answer"),
-                "score": result.get("score")
-            }
+            with model_call('qa'):
+                result = self.models['qa']({"context": text, "question": question})
+            return QAAnswer(
+                question=question,
+                answer=result.get("answer"),
+                score=result.get("score"),
+                start=result.get("start"),
+                end=result.get("end")
+            ).model_dump()
         except Exception as e:
             logger.error(f"Error answering question: {e}")
             return {"error": str(e)}
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.models = {}
-        self._load_models()
-    
-    def _load_models(self):
+
+    def answer_questions(self, text: str, questions: List[str]) -> Any:
+        """
+        Answer several questions about the same text. The context is
+        tokenized once and every (question, context window) pair runs through
+        the QA model in batched forward passes. Returns one result per
+        question, in order, with character offsets of the answer, matching
+        what the question-answering pipeline returns for each question.
+        """
+        qa = self.models.get('qa')
+        if not qa:
+            return {"error": "QA model not available"}
         try:
-            self.models['invoice'] = pipeline(
-                "token-classification",
-                model="dbmdz/bert-large-cased-finetuned-conll03-english",
-                device=0 if self.device == "cuda" else -1
-            )
-            self.models['resume'] = pipeline(
-                "token-classification", 
-                model="dbmdz/bert-large-cased-finetuned-conll03-english",
-                device=0 if self.device == "cuda" else -1
-            )
-            self.models['research_paper'] = pipeline(
-                "summarization",
-                model="facebook/bart-large-cnn",
-                device=0 if self.device == "cuda" else -1
-            )
-            self.models['other'] = None  # placeholder
-            logger.info("All models loaded successfully")
+            with model_call('qa_batch'):
+                if getattr(qa, 'tokenizer', None) is not None and getattr(qa, 'model', None) is not None:
+                    return self._answer_questions_batched(qa.tokenizer, qa.model, text, questions)
+            # Pipelines without direct model access fall back to one call each.
+            answers = []
+            for question in questions:
+                result = qa({"context": text, "question": question})
+                answers.append(QAAnswer(
+                    question=question,
+                    answer=result.get("answer"),
+                    score=result.get("score"),
+                    start=result.get("start"),
+                    end=result.get("end")
+                ).model_dump())
+            return answers
         except Exception as e:
-            logger.error(f"Error loading models: {e}")
-            self._load_fallback_models()
-    
+            logger.error(f"Error answering questions: {e}")
+            return {"error": str(e)}
+
+    def _answer_questions_batched(self, tokenizer, model, text, questions,
+                                  max_length=384, stride=128, max_answer_len=15, batch_size=32, top_k=12):
+        """
+        Decode answers the way the question-answering pipeline does: spans
+        are scored per window against the context and CLS tokens, the best
+        `top_k` of each window are widened to whole words, and the scores of
+        identical answers found in several (overlapping) windows are summed.
+        """
+        import numpy as np
+        import torch
+
+        context = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        context_ids = context["input_ids"]
+        context_offsets = context["offset_mapping"]
+        use_token_types = "token_type_ids" in tokenizer.model_input_names
+
+        # One feature per (question, context window); windows overlap by `stride`.
+        features = []
+        for index, question in enumerate(questions):
+            question_ids = tokenizer(question, add_special_tokens=False)["input_ids"][:64]
+            window = max(max_length - len(question_ids) - tokenizer.num_special_tokens_to_add(pair=True), 1)
+            step = max(window - stride, 1)
+            marker = tokenizer.build_inputs_with_special_tokens(question_ids, [-1])
+            context_start = marker.index(-1)
+            cls_positions = [i for i, token in enumerate(marker) if token == tokenizer.cls_token_id]
+            for window_start in range(0, max(len(context_ids), 1), step):
+                chunk = context_ids[window_start:window_start + window]
+                input_ids = tokenizer.build_inputs_with_special_tokens(question_ids, chunk)
+                token_types = (tokenizer.create_token_type_ids_from_sequences(question_ids, chunk)
+                               if use_token_types else None)
+                features.append((index, input_ids, token_types, context_start, cls_positions,
+                                 window_start, len(chunk)))
+                if window_start + window >= len(context_ids):
+                    break
+
+        candidates = [{} for _ in questions]  # answer text -> [score, start char, end char]
+        for batch_start in range(0, len(features), batch_size):
+            batch = features[batch_start:batch_start + batch_size]
+            width = max(len(f[1]) for f in batch)
+            pad_id = tokenizer.pad_token_id or 0
+            input_ids = torch.tensor([f[1] + [pad_id] * (width - len(f[1])) for f in batch])
+            attention_mask = torch.tensor([[1] * len(f[1]) + [0] * (width - len(f[1])) for f in batch])
+            inputs = {"input_ids": input_ids.to(model.device), "attention_mask": attention_mask.to(model.device)}
+            if use_token_types:
+                inputs["token_type_ids"] = torch.tensor(
+                    [f[2] + [0] * (width - len(f[2])) for f in batch]
+                ).to(model.device)
+            with torch.no_grad():
+                output = model(**inputs)
+            start_logits = output.start_logits.float().cpu().numpy()
+            end_logits = output.end_logits.float().cpu().numpy()
+
+            for row, (index, _, _, context_start, cls_positions, window_start, chunk_len) in enumerate(batch):
+                if chunk_len == 0:
+                    continue
+                # CLS takes part in the softmax but can't be part of an answer.
+                kept = cls_positions + list(range(context_start, context_start + chunk_len))
+                start_probs = _softmax(start_logits[row, kept])[len(cls_positions):]
+                end_probs = _softmax(end_logits[row, kept])[len(cls_positions):]
+                # Score every span with start <= end < start + max_answer_len.
+                scores = np.triu(np.tril(np.outer(start_probs, end_probs), max_answer_len - 1)).ravel()
+                best = np.argpartition(-scores, top_k)[:top_k] if scores.size > top_k else np.arange(scores.size)
+                for position in best[np.argsort(-scores[best])]:
+                    if scores[position] <= 0:
+                        continue
+                    start, end = divmod(int(position), chunk_len)
+                    char_start, char_end = _word_span(context, context_offsets,
+                                                      window_start + start, window_start + end)
+                    found = candidates[index].setdefault(text[char_start:char_end], [0.0, char_start, char_end])
+                    found[0] += float(scores[position])
+
+        answers = []
+        for question, found in zip(questions, candidates):
+            if not found:
+                answers.append(QAAnswer(question=question, answer="", score=0.0).model_dump())
+                continue
+            answer, (score, char_start, char_end) = max(found.items(), key=lambda item: item[1][0])
+            answers.append(QAAnswer(
+                question=question,
+                answer=answer,
+                score=score,
+                start=char_start,
+                end=char_end
+            ).model_dump())
+        return answers
+
     def _load_fallback_models(self):
         self.models['invoice'] = None
         self.models['resume'] = None
@@ -130,130 +386,128 @@ class DocumentProcessor:
         self.models['other'] = None
         logger.info("Using fallback text processing")
 
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
+    def extract_text_from_pdf(self, source) -> str:
+        """
+        Extract text from a PDF given as a file path, bytes, memoryview, mmap
+        or file object. Buffers are parsed in place, never via a temp file.
+        """
         try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text
+            with stage('extract_text'):
+                return extract_text(source)
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {e}")
             return ""
     
-    def process_invoice(self, text: str) -> Dict[str, Any]:
+    def _extract_fields(self, document_type, pages):
+        return {
+            field: _scan(pages, getattr(self, f"_extract_{field}"), scope, FIELD_SETTLED.get(field))
+            for field, scope in FIELD_SCOPES[document_type].items()
+        }
+
+    def process_invoice(self, text) -> InvoiceData:
+        """`text` may be a string or DocumentPages, which are parsed only as far as needed."""
+        pages = DocumentPages.of(text)
         try:
-            invoice_data = {
-                "invoice_number": self._extract_invoice_number(text),
-                "date": self._extract_date(text),
-                "vendor_name": self._extract_vendor_name(text),
-                "total_amount": self._extract_total_amount(text),
-                "line_items": self._extract_line_items(text)
-            }
+            with stage('invoice.fields'):
+                invoice_data = self._extract_fields('invoice', pages)
             if self.models.get('invoice'):
                 try:
-                    entities = self.models['invoice'](text[:512])
+                    ner_text = pages.prefix(512)
+                    with model_call('invoice'):
+                        entities = self.models['invoice'](ner_text)
                     invoice_data['entities'] = entities
                 except Exception as e:
                     logger.warning(f"Model processing failed: {e}")
-            return make_json_serializable(invoice_data)
+            return InvoiceData(**invoice_data)
         except Exception as e:
             logger.error(f"Error processing invoice: {e}")
-            return {"error": str(e)}
+            return ExtractionFailure(error=str(e))
     
-    def process_resume(self, text: str) -> Dict[str, Any]:
+    def process_resume(self, text) -> ResumeData:
+        pages = DocumentPages.of(text)
         try:
-            resume_data = {
-                "name": self._extract_name(text),
-                "email": self._extract_email(text),
-                "phone": self._extract_phone(text),
-                "education": self._extract_education(text),
-                "experience": self._extract_experience(text),
-                "skills": self._extract_skills(text)
-            }
+            with stage('resume.fields'):
+                resume_data = self._extract_fields('resume', pages)
             if self.models.get('resume'):
                 try:
-                    entities = self.models['resume'](text[:512])
+                    ner_text = pages.prefix(512)
+                    with model_call('resume'):
+                        entities = self.models['resume'](ner_text)
                     resume_data['entities'] = entities
                 except Exception as e:
                     logger.warning(f"Model processing failed: {e}")
-            return make_json_serializable(resume_data)
+            return ResumeData(**resume_data)
         except Exception as e:
             logger.error(f"Error processing resume: {e}")
-            return {"error": str(e)}
+            return ExtractionFailure(error=str(e))
 
-    def process_research_paper(self, text: str) -> Dict[str, Any]:
+    def process_research_paper(self, text) -> ResearchPaperData:
+        pages = DocumentPages.of(text)
         try:
-            paper_data = {
-                "title": self._extract_title(text),
-                "authors": self._extract_authors(text),
-                "abstract": self._extract_abstract(text),
-                "keywords": self._extract_keywords(text),
-                "sections": self._extract_sections(text)
-            }
+            with stage('research_paper.fields'):
+                paper_data = self._extract_fields('research_paper', pages)
             if self.models.get('research_paper'):
                 try:
-                    summary_text = text[:1024]
-                    summary = self.models['research_paper'](summary_text, max_length=150, min_length=50)
+                    summary_text = pages.prefix(1024)
+                    with model_call('research_paper'):
+                        summary = self.models['research_paper'](summary_text, max_length=150, min_length=50)
                     paper_data['summary'] = summary[0]['summary_text']
                 except Exception as e:
                     logger.warning(f"Summarization failed: {e}")
-            return make_json_serializable(paper_data)
+            return ResearchPaperData(**paper_data)
         except Exception as e:
             logger.error(f"Error processing research paper: {e}")
-            return {"error": str(e)}
+            return ExtractionFailure(error=str(e))
 
-    def process_custom(self, text: str, prompt: str) -> Dict[str, Any]:
+    def process_custom(self, text, prompt: str) -> CustomExtractionData:
         """Process document using Mistral-7B-Instruct locally"""
         # Basic prompt sanitization (prevent prompt injection/abuse)
         safe_prompt = prompt.replace("[INST]", "").replace("[/INST]", "").strip()[:500]
         try:
+            # The prompt may ask about anything, so the whole document is read.
+            text = DocumentPages.of(text).text
             chunks = [text[i:i+3000] for i in range(0, len(text), 3000)]
             full_response = ""
 
-            llm = get_llama_model()
+            llm = self.models.get('other') or get_llama_model()
 
             for chunk in chunks:
                 full_prompt = f"[INST] {safe_prompt}\n\n{chunk.strip()} [/INST]"
-                result = llm(full_prompt, max_tokens=1024, stop=["</s>"])
+                chunk_start = time.perf_counter()
+                with model_call('mistral'):
+                    result = llm(full_prompt, max_tokens=1024, stop=["</s>"])
+                completion_tokens = result.get("usage", {}).get("completion_tokens")
+                if completion_tokens:
+                    LLM_TOKENS_PER_SECOND.observe(
+                        completion_tokens / max(time.perf_counter() - chunk_start, 1e-9), model='mistral'
+                    )
                 response = result["choices"][0]["text"].strip()
                 full_response += response + "\n---\n"
 
-            return {
-                "prompt_used": safe_prompt,
-                "model": "mistral-7b-instruct.Q4_K_M.gguf (local)",
-                "result": full_response.strip()
-            }
+            return CustomExtractionData(
+                prompt_used=safe_prompt,
+                model="mistral-7b-instruct.Q4_K_M.gguf (local)",
+                result=full_response.strip()
+            )
 
         except Exception as e:
             logger.error(f"Error using Mistral: {e}")
-            return {"error": str(e)}
+            return ExtractionFailure(error=str(e))
 
         
     # Helper methods for text extraction
     def _extract_invoice_number(self, text: str) -> Optional[str]:
-        patterns = [
-            r'invoice\s*#?\s*:?\s*([A-Z0-9-]+)',
-            r'inv\s*#?\s*:?\s*([A-Z0-9-]+)',
-            r'#\s*([A-Z0-9-]+)'
-        ]
-        for pattern in patterns:
+        for pattern in INVOICE_NUMBER_PATTERNS:
             match = re.search(pattern, text, re.IGNORECASE)
             if match:
                 return match.group(1)
         return None
     
     def _extract_date(self, text: str) -> Optional[str]:
-        patterns = [
-            r'\b(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\b',
-            r'\b(\d{4}[/-]\d{1,2}[/-]\d{1,2})\b',
-            r'\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2},?\s+\d{4}\b'
-        ]
-        for pattern in patterns:
+        for pattern in DATE_PATTERNS:
             match = re.search(pattern, text, re.IGNORECASE)
             if match:
-                return match.group(1)
+                return match.group(0)
         return None
     
     def _extract_vendor_name(self, text: str) -> Optional[str]:
@@ -264,12 +518,7 @@ class DocumentProcessor:
         return None
     
     def _extract_total_amount(self, text: str) -> Optional[float]:
-        patterns = [
-            r'total\s*:?\s*\$?(\d+\.?\d*)',
-            r'amount\s*:?\s*\$?(\d+\.?\d*)',
-            r'\$(\d+\.?\d*)'
-        ]
-        for pattern in patterns:
+        for pattern in TOTAL_AMOUNT_PATTERNS:
             matches = re.findall(pattern, text, re.IGNORECASE)
             if matches:
                 try:
@@ -301,11 +550,7 @@ class DocumentProcessor:
         return match.group(0) if match else None
     
     def _extract_phone(self, text: str) -> Optional[str]:
-        patterns = [
-            r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
-            r'\(\d{3}\)\s*\d{3}[-.]?\d{4}'
-        ]
-        for pattern in patterns:
+        for pattern in PHONE_PATTERNS:
             match = re.search(pattern, text)
             if match:
                 return match.group(0)
@@ -354,13 +599,13 @@ class DocumentProcessor:
         return authors[:5]
     
     def _extract_abstract(self, text: str) -> Optional[str]:
-        abstract_match = re.search(r'abstract\s*:?\s*(.*?)(?=\n\n|\nkeywords|\nintroduction)', text, re.IGNORECASE | re.DOTALL)
+        abstract_match = ABSTRACT_RE.search(text)
         if abstract_match:
             return abstract_match.group(1).strip()
         return None
     
     def _extract_keywords(self, text: str) -> list:
-        keyword_match = re.search(r'keywords?\s*:?\s*(.*?)(?=\n\n|\nintroduction)', text, re.IGNORECASE)
+        keyword_match = KEYWORDS_RE.search(text)
         if keyword_match:
             keywords = keyword_match.group(1).split(',')
             return [kw.strip() for kw in keywords[:10]]
@@ -368,7 +613,7 @@ class DocumentProcessor:
     
     def _extract_sections(self, text: str) -> list:
         sections = []
-        section_headers = re.findall(r'\n([A-Z][A-Za-z\s]+)\n', text)
+        section_headers = SECTION_RE.findall(text)
         for header in section_headers[:10]:
             sections.append({"title": header.strip()})
         return sections
@@ -389,5 +634,28 @@ class DocumentProcessor:
         return analysis
 
 
-# Global processor instance
-processor = DocumentProcessor()
\ No newline at end of file
+# Global processor instance, created on first use so importing this module
+# does not load every model.
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_processor() -> DocumentProcessor:
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = enable_batching(DocumentProcessor())
+    return _processor
+
+
+def set_processor(instance: Optional[DocumentProcessor]):
+    """Replace the global processor, e.g. with one backed by stub models."""
+    global _processor
+    _processor = instance
+
+
+def __getattr__(name):
+    if name == 'processor':
+        return get_processor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,217 @@
+"""
+Persistent cache of QA answers.
+
+Entries are keyed by (sha256 of the document's extracted text, normalized
+question, QA model version). Re-extraction that changes the text or a new
+QA_MODEL_VERSION therefore misses automatically; stale rows are purged on
+re-extraction or age out through LRU eviction.
+"""
+import hashlib
+import logging
+import re
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .executors import ExecutorBusy, get_executor
+from .metrics import record_cache_lookup
+from .models import CachedAnswer, Document, ExtractionResult
+
+logger = logging.getLogger(__name__)
+
+_stored_since_evict = 0
+_evict_lock = threading.Lock()
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r'\s+', ' ', question.strip().lower())
+    return question.rstrip('?.! ')
+
+
+def _question_hash(question: str) -> str:
+    return hashlib.sha256(normalize_question(question).encode('utf-8')).hexdigest()
+
+
+def model_version() -> str:
+    return settings.QA_MODEL_VERSION
+
+
+def document_text_hash(document):
+    """Hash of the document's extracted text, if it has been extracted."""
+    result = ExtractionResult.objects.filter(document=document).values_list('text_sha256', flat=True).first()
+    return result or None
+
+
+def record_text_hash(document, content_hash):
+    """
+    Store the text hash on a result that extraction left without one because
+    it did not parse every page.
+    """
+    ExtractionResult.objects.filter(document=document, text_sha256='').update(text_sha256=content_hash)
+
+
+def get_cached_answers(content_hash, questions):
+    """Return {index: answer} for the questions already answered for this text."""
+    if not content_hash:
+        for _ in questions:
+            record_cache_lookup('qa_answers', False)
+        return {}
+    hashes = [_question_hash(q) for q in questions]
+    entries = {
+        entry.question_hash: entry
+        for entry in CachedAnswer.objects.filter(
+            content_hash=content_hash, model_version=model_version(), question_hash__in=set(hashes)
+        )
+    }
+    found = {}
+    for index, (question, question_hash) in enumerate(zip(questions, hashes)):
+        entry = entries.get(question_hash)
+        record_cache_lookup('qa_answers', entry is not None)
+        if entry is not None:
+            found[index] = {**entry.answer, 'question': question}
+    if entries:
+        CachedAnswer.objects.filter(pk__in=[e.pk for e in entries.values()]).update(
+            last_used_at=timezone.now(), hits=F('hits') + 1
+        )
+    return found
+
+
+def store_answers(content_hash, answers):
+    """Cache successful answers and evict least recently used entries past the cap."""
+    entries = [
+        CachedAnswer(
+            content_hash=content_hash,
+            question_hash=_question_hash(answer['question']),
+            question=answer['question'],
+            model_version=model_version(),
+            answer=answer
+        )
+        for answer in answers
+        if isinstance(answer, dict) and 'error' not in answer and answer.get('question')
+    ]
+    if not entries:
+        return
+    CachedAnswer.objects.bulk_create(entries, ignore_conflicts=True)
+    _evict_after(len(entries))
+
+
+def _evict_after(stored):
+    """Evict once every ANSWER_CACHE_EVICT_INTERVAL stored rows rather than counting the table each time."""
+    global _stored_since_evict
+    with _evict_lock:
+        _stored_since_evict += stored
+        if _stored_since_evict < settings.ANSWER_CACHE_EVICT_INTERVAL:
+            return
+        _stored_since_evict = 0
+    evict()
+
+
+def evict(max_entries=None):
+    max_entries = max_entries if max_entries is not None else settings.ANSWER_CACHE_MAX_ENTRIES
+    excess = CachedAnswer.objects.count() - max_entries
+    if excess > 0:
+        stale = CachedAnswer.objects.order_by('last_used_at').values_list('pk', flat=True)[:excess]
+        CachedAnswer.objects.filter(pk__in=list(stale)).delete()
+
+
+def invalidate(content_hash):
+    """Drop cached answers for a text hash no extraction result still uses."""
+    if content_hash and not ExtractionResult.objects.filter(text_sha256=content_hash).exists():
+        CachedAnswer.objects.filter(content_hash=content_hash).delete()
+
+
+def _compute_answers(processor, questions, load_text):
+    """
+    Run the QA model on `questions`, returning (text hash, answers). Single
+    questions go through answer_questions too, so every cached answer has
+    the same shape, offsets included, whichever endpoint stored it.
+    """
+    text = load_text()
+    return text_sha256(text), processor.answer_questions(text, questions)
+
+
+def answer_with_cache(processor, document, questions, load_text):
+    """
+    Answer `questions` about `document`, serving cached answers first and
+    running the QA model only for the misses on the shared 'inference'
+    executor. `load_text` is called only on a miss, so cache hits skip PDF
+    parsing entirely.
+    """
+    content_hash = document_text_hash(document)
+    answers = get_cached_answers(content_hash, questions)
+    missing = [i for i in range(len(questions)) if i not in answers]
+    if missing:
+        text_hash, fresh = get_executor('inference').call_for(
+            document.user_id, _compute_answers, processor, [questions[i] for i in missing], load_text
+        )
+        if isinstance(fresh, dict):
+            return fresh
+        if not content_hash:
+            record_text_hash(document, text_hash)
+        store_answers(content_hash or text_hash, fresh)
+        answers.update(zip(missing, fresh))
+    return [answers[i] for i in range(len(questions))]
+
+
+async def aanswer_with_cache(processor, document, questions, load_text, executor):
+    """
+    Async answer_with_cache: cache reads and writes go through the ORM on
+    the sync thread, and text loading plus the QA model run on `executor`.
+    """
+    content_hash = await sync_to_async(document_text_hash)(document)
+    answers = await sync_to_async(get_cached_answers)(content_hash, questions)
+    missing = [i for i in range(len(questions)) if i not in answers]
+    if missing:
+        text_hash, fresh = await executor.run_for(
+            document.user_id, _compute_answers, processor, [questions[i] for i in missing], load_text
+        )
+        if isinstance(fresh, dict):
+            return fresh
+        if not content_hash:
+            await sync_to_async(record_text_hash)(document, text_hash)
+        await sync_to_async(store_answers)(content_hash or text_hash, fresh)
+        answers.update(zip(missing, fresh))
+    return [answers[i] for i in range(len(questions))]
+
+
+def _prefill(document_id):
+    from .inference_client import get_processor
+    from .storage import open_document_buffer
+
+    try:
+        document = Document.objects.get(pk=document_id)
+        questions = settings.ANSWER_CACHE_PREFILL_QUESTIONS.get(document.document_type, [])
+        if not questions:
+            return
+
+        def load_text():
+            with open_document_buffer(document) as buffer:
+                return get_processor().extract_text_from_pdf(buffer)
+
+        answer_with_cache(get_processor(), document, questions, load_text)
+    except Exception as e:
+        logger.warning(f"Answer cache prefill failed for document {document_id}: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_prefill(document):
+    """
+    Answer the common questions for this document type in the background.
+    Prefill is best effort: when the 'answer_prefill' executor is full it is
+    skipped, and the first ask fills the cache instead.
+    """
+    if not settings.ANSWER_CACHE_PREFILL_QUESTIONS.get(document.document_type):
+        return
+    try:
+        get_executor('answer_prefill').submit(_prefill, document.pk)
+    except ExecutorBusy:
+        logger.info(f"Skipped answer cache prefill for document {document.pk}: prefill queue is full")
@@ -0,0 +1,281 @@
+"""
+Async versions of the upload, list, detail and ask endpoints for ASGI.
+
+DRF views are synchronous, so these are plain Django async views that
+authenticate with the same JWTs. Database access goes through the async ORM
+and PDF parsing and model calls through the bounded executors in
+executors.py, so a slow extraction never ties up the event loop.
+"""
+import json
+import logging
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .answer_cache import aanswer_with_cache
+from .executors import ExecutorBusy, get_executor
+from .inference_client import get_processor
+from .models import Document
+from .pipeline import ExtractionError, aextract_upload
+from .response_cache import acached_payload, not_modified, with_validators
+from .serializers import DocumentUploadSerializer
+from .storage import open_document_buffer
+from .throttling import charge, extraction_cost, is_unserved, question_cost, refund
+from .views import _document_detail, _document_summary, _extraction_response
+
+logger = logging.getLogger(__name__)
+
+_authenticator = JWTAuthentication()
+
+
+def async_api_view(methods):
+    """
+    Allow only `methods`, require a valid JWT (request.user is set from it),
+    refund the quota the view charged through _charge() if the request ends
+    up rejected or not served, and turn ExecutorBusy into 503 with
+    Retry-After.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'},
+                                    status=status.HTTP_405_METHOD_NOT_ALLOWED)
+            try:
+                user_auth = await sync_to_async(_authenticator.authenticate)(request)
+            except AuthenticationFailed as e:
+                return JsonResponse({'detail': e.detail}, status=status.HTTP_401_UNAUTHORIZED)
+            if user_auth is None:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                                    status=status.HTTP_401_UNAUTHORIZED)
+            request.user = user_auth[0]
+            request.quota_charge = 0
+            try:
+                response = await view(request, *args, **kwargs)
+            except ExecutorBusy as e:
+                response = JsonResponse({
+                    'success': False,
+                    'message': 'Server is busy, please retry shortly'
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                response['Retry-After'] = str(e.retry_after)
+            if request.quota_charge and is_unserved(response.status_code):
+                await sync_to_async(refund)(request.user.pk, request.quota_charge)
+            return response
+        return wrapped
+    return decorator
+
+
+async def _charge(request, endpoint, cost):
+    """
+    Charge `cost` to the user's quota once the request has been validated.
+    Returns a 429 response with Retry-After if the bucket holds too little.
+    """
+    wait = await sync_to_async(charge)(request.user, endpoint, cost)
+    if wait:
+        wait = math.ceil(wait)
+        response = JsonResponse({
+            'detail': f'Request was throttled. Expected available in {wait} seconds.'
+        }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(wait)
+        return response
+    request.quota_charge = cost
+    return None
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+def _form_data(request):
+    data = request.POST.copy()
+    data.update(request.FILES)
+    return data
+
+
+@async_api_view(['POST'])
+async def extract_document(request):
+    """
+    Upload and extract a document without holding a worker thread
+    """
+    # Multipart parsing may spool the upload to disk.
+    serializer = DocumentUploadSerializer(data=await sync_to_async(_form_data)(request))
+    if not serializer.is_valid():
+        return JsonResponse({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    file = serializer.validated_data['file']
+    document_type = serializer.validated_data['document_type']
+    custom_prompt = serializer.validated_data.get('custom_prompt', '')
+    title = serializer.validated_data.get('title', file.name)
+
+    if not file.name.lower().endswith('.pdf'):
+        return JsonResponse({
+            'success': False,
+            'message': 'Only PDF files are supported'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    throttled = await _charge(request, 'extract', extraction_cost(document_type))
+    if throttled:
+        return throttled
+
+    try:
+        document, result = await aextract_upload(
+            file,
+            user=request.user,
+            title=title,
+            document_type=document_type,
+            custom_prompt=custom_prompt if document_type == 'other' else None
+        )
+    except ExtractionError as e:
+        return JsonResponse({
+            'success': False,
+            'message': e.message
+        }, status=e.status_code)
+    except ExecutorBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing document: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'Error processing document: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return JsonResponse(_extraction_response(document, result), status=status.HTTP_200_OK)
+
+
+@async_api_view(['GET'])
+async def get_documents(request):
+    """
+    Get list of all uploaded documents
+    """
+    async def build():
+        documents = Document.objects.filter(user=request.user).select_related('result').order_by('-uploaded_at')
+        return [_document_summary(doc) async for doc in documents]
+
+    try:
+        data, etag, last_modified = await acached_payload(
+            'document_list', 'documents', request.user.id, build, user_id=request.user.id
+        )
+    except Exception as e:
+        logger.error(f"Error getting documents: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': 'Error retrieving documents'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    cached = not_modified(request, etag, last_modified)
+    if cached is not None:
+        return cached
+    return with_validators(JsonResponse({'success': True, 'documents': data}), etag, last_modified)
+
+
+@async_api_view(['GET'])
+async def get_document_detail(request, document_id):
+    """
+    Get detailed information about a specific document
+    """
+    async def build():
+        return _document_detail(
+            await Document.objects.select_related('result').aget(id=document_id, user=request.user)
+        )
+
+    try:
+        data, etag, last_modified = await acached_payload(
+            'document_detail', 'document', document_id, build, user_id=request.user.id
+        )
+    except Document.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'message': 'Document not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.error(f"Error getting document detail: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': 'Error retrieving document details'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    cached = not_modified(request, etag, last_modified)
+    if cached is not None:
+        return cached
+    return with_validators(JsonResponse({'success': True, 'document': data}), etag, last_modified)
+
+
+async def _answer(request, document_id, questions):
+    document = await Document.objects.aget(id=document_id, user=request.user)
+    executor = get_executor('inference')
+    processor = await executor.run_for(request.user.pk, get_processor)
+
+    def load_text():
+        with open_document_buffer(document) as buffer:
+            return processor.extract_text_from_pdf(buffer)
+
+    return await aanswer_with_cache(processor, document, questions, load_text, executor)
+
+
+@async_api_view(['POST'])
+async def ask_question(request, document_id):
+    """
+    Answer a user question about a specific document using the QA pipeline
+    """
+    body = await sync_to_async(_json_body)(request)
+    question = body.get('question') if isinstance(body, dict) else None
+    if not question:
+        return JsonResponse({'success': False, 'message': 'Question is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    throttled = await _charge(request, 'ask', question_cost(1))
+    if throttled:
+        return throttled
+    try:
+        results = await _answer(request, document_id, [question])
+        result = results if isinstance(results, dict) else results[0]
+        return JsonResponse({'success': True, 'result': result}, status=status.HTTP_200_OK)
+    except Document.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Document not found.'}, status=status.HTTP_404_NOT_FOUND)
+    except ExecutorBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Error in ask_question: {e}")
+        return JsonResponse({'success': False, 'message': 'Error answering question.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['POST'])
+async def ask_questions(request, document_id):
+    """
+    Answer a list of questions about one document in a single batched QA pass
+    """
+    body = await sync_to_async(_json_body)(request)
+    questions = body.get('questions') if isinstance(body, dict) else None
+    if (not isinstance(questions, list) or not questions
+            or not all(isinstance(q, str) and q.strip() for q in questions)):
+        return JsonResponse({'success': False, 'message': 'questions must be a non-empty list of strings.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(questions) > settings.MAX_QUESTIONS_PER_REQUEST:
+        return JsonResponse({'success': False, 'message': f'At most {settings.MAX_QUESTIONS_PER_REQUEST} questions per request.'}, status=status.HTTP_400_BAD_REQUEST)
+    throttled = await _charge(request, 'ask', question_cost(len(questions)))
+    if throttled:
+        return throttled
+    try:
+        results = await _answer(request, document_id, [q.strip() for q in questions])
+        if isinstance(results, dict) and 'error' in results:
+            logger.error(f"Error in ask_questions: {results['error']}")
+            return JsonResponse({'success': False, 'message': 'Error answering questions.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({'success': True, 'results': results}, status=status.HTTP_200_OK)
+    except Document.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Document not found.'}, status=status.HTTP_404_NOT_FOUND)
+    except ExecutorBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Error in ask_questions: {e}")
+        return JsonResponse({'success': False, 'message': 'Error answering questions.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
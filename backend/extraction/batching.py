@@ -0,0 +1,190 @@
+"""
+Dynamic micro-batching for model pipelines.
+
+Concurrent callers submit single inputs; a background thread gathers them for
+up to `max_wait_ms` or until `max_batch_size` is reached, runs one batched
+forward pass, and hands each caller its own result.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .metrics import BATCH_SIZE, QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=5, name='batch'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Batcher {self.name} has been closed")
+            self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def close(self):
+        """
+        Stop accepting work and stop the worker thread. The batch already
+        running finishes; inputs still waiting fail with RuntimeError.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while True:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is not None:
+                    entry[1].set_exception(RuntimeError(f"Batcher {self.name} was closed"))
+            self._queue.put(None)
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Run what we have, then stop on the next collect.
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                QUEUE_WAIT_SECONDS.observe(started - queued_at, queue=self.name)
+            BATCH_SIZE.observe(len(batch), pipeline=self.name)
+            try:
+                results = list(self.batch_fn([item for item, _, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} returned {len(results)} results for {len(batch)} inputs")
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+
+class BatchedPipeline:
+    """
+    Drop-in replacement for a transformers pipeline that batches calls made
+    concurrently from different threads. Calls with different keyword
+    arguments are batched separately.
+    """
+
+    def __init__(self, pipeline, name, max_batch_size=8, max_wait_ms=5):
+        self.pipeline = pipeline
+        self.task = getattr(pipeline, 'task', None)
+        self._batcher = MicroBatcher(self._run_batch, max_batch_size, max_wait_ms, name=name)
+
+    def __getattr__(self, name):
+        return getattr(self.pipeline, name)
+
+    def close(self):
+        self._batcher.close()
+
+    def __call__(self, inputs, **kwargs):
+        return self._batcher((inputs, kwargs))
+
+    def _run_batch(self, items):
+        results = [None] * len(items)
+        groups = {}
+        for index, (inputs, kwargs) in enumerate(items):
+            groups.setdefault(repr(sorted(kwargs.items())), []).append(index)
+        for indices in groups.values():
+            kwargs = items[indices[0]][1]
+            inputs = [items[i][0] for i in indices]
+            for i, output in zip(indices, self._call_pipeline(inputs, kwargs)):
+                results[i] = output
+        return results
+
+    def _call_pipeline(self, inputs, kwargs):
+        # A single input, or a pipeline that cannot batch, keeps the exact
+        # output shape of an unbatched call.
+        if len(inputs) == 1 or self.task not in ('token-classification', 'ner', 'question-answering', 'summarization'):
+            return [self.pipeline(single, **kwargs) for single in inputs]
+        outputs = self.pipeline(inputs, batch_size=len(inputs), **kwargs)
+        if self.task == 'summarization':
+            # Batched summarization returns one dict per input, a single call a list.
+            return [[output] for output in outputs]
+        return outputs
+
+
+def batching_config(name=None):
+    """
+    Batch settings from settings.INFERENCE_BATCHING, with optional
+    per-pipeline overrides under 'pipelines'.
+    """
+    from django.conf import settings
+
+    config = dict(getattr(settings, 'INFERENCE_BATCHING', {}))
+    overrides = config.pop('pipelines', {})
+    if name:
+        config.update(overrides.get(name, {}))
+    return config
+
+
+def enable_batching(processor, max_batch_size=None, max_wait_ms=None):
+    """
+    Put a micro-batcher in front of each of the processor's pipelines.
+    Arguments left as None come from settings.INFERENCE_BATCHING.
+    """
+    for name in ('invoice', 'resume', 'research_paper', 'qa'):
+        model = processor.models.get(name)
+        if model is None or isinstance(model, BatchedPipeline):
+            continue
+        config = batching_config(name)
+        explicit = max_batch_size is not None or max_wait_ms is not None
+        if not config.get('enabled', True) and not explicit:
+            continue
+        processor.models[name] = BatchedPipeline(
+            model,
+            name,
+            max_batch_size=max_batch_size if max_batch_size is not None else config.get('max_batch_size', 8),
+            max_wait_ms=max_wait_ms if max_wait_ms is not None else config.get('max_wait_ms', 5)
+        )
+    return processor
+
+
+def disable_batching(processor):
+    """Unwrap batched pipelines, stopping their worker threads."""
+    for name, model in list(processor.models.items()):
+        if isinstance(model, BatchedPipeline):
+            model.close()
+            processor.models[name] = model.pipeline
+    return processor
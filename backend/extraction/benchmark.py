@@ -0,0 +1,487 @@
+"""
+Reproducible benchmarks for the extraction pipeline.
+
+Generates a synthetic PDF corpus with PyMuPDF, times every DocumentProcessor
+stage and the HTTP endpoints, and returns a JSON-serializable report so
+results can be compared across commits. Run through
+`python manage.py benchmark_pipeline`.
+"""
+import ctypes
+import gc
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+DOCUMENT_TYPES = ('invoice', 'resume', 'research_paper')
+
+_WORDS = (
+    "analysis data model system result method performance value process design "
+    "report service customer product quality network support project evaluation "
+    "market revenue research development training learning software platform"
+).split()
+_FIRST_NAMES = ["Alice", "Rahul", "Maria", "Chen", "Fatima", "John", "Priya", "Lucas"]
+_LAST_NAMES = ["Sharma", "Garcia", "Smith", "Wang", "Khan", "Muller", "Rossi", "Patel"]
+_SKILLS = ["Python", "Java", "JavaScript", "React", "Django", "SQL", "HTML", "CSS"]
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _person(rng):
+    return f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}"
+
+
+def _invoice_pages(rng, pages):
+    header = [
+        "Acme Supplies Limited",
+        f"Invoice #INV-{rng.randint(10000, 99999)}",
+        f"Date: {rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024",
+        f"Bill To: {_person(rng)}",
+        "",
+    ]
+    total = 0.0
+    for page in range(pages):
+        lines = header if page == 0 else [f"Continued - page {page + 1}", ""]
+        for _ in range(40):
+            qty, price = rng.randint(1, 20), round(rng.uniform(1, 500), 2)
+            total += qty * price
+            lines = lines + [f"{rng.choice(_WORDS).title()} {rng.choice(_WORDS)}  x{qty}  ${price:.2f}"]
+        if page == pages - 1:
+            lines = lines + ["", f"Total: ${total:.2f}"]
+        yield "\n".join(lines)
+
+
+def _resume_pages(rng, pages):
+    for page in range(pages):
+        if page == 0:
+            lines = [
+                _person(rng),
+                f"{rng.choice(_FIRST_NAMES).lower()}@example.com | 555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+                "",
+                "Education",
+                f"Bachelor of Science, State University, {rng.randint(2005, 2020)}",
+                "",
+                "Experience",
+            ]
+        else:
+            lines = ["Experience (continued)"]
+        for _ in range(8):
+            lines.append(f"Senior {rng.choice(_WORDS).title()} Engineer position, {rng.randint(2010, 2024)}")
+            lines.append(_sentence(rng, 18))
+        lines.append("Skills: " + ", ".join(rng.sample(_SKILLS, 4)))
+        yield "\n".join(lines)
+
+
+def _paper_pages(rng, pages):
+    for page in range(pages):
+        if page == 0:
+            lines = [
+                f"On the {rng.choice(_WORDS).title()} of {rng.choice(_WORDS).title()} {rng.choice(_WORDS).title()} Systems",
+                f"{_person(rng)}, {_person(rng)}",
+                "",
+                "Abstract: " + " ".join(_sentence(rng) for _ in range(4)),
+                "",
+                "Keywords: " + ", ".join(rng.sample(_WORDS, 5)),
+                "",
+                "Introduction",
+            ]
+        else:
+            lines = [f"Section {page + 1}"]
+        lines.extend(_sentence(rng, 16) for _ in range(30))
+        yield "\n".join(lines)
+
+
+_GENERATORS = {
+    'invoice': _invoice_pages,
+    'resume': _resume_pages,
+    'research_paper': _paper_pages,
+}
+
+
+def generate_pdf(document_type, pages, seed=0) -> bytes:
+    """Build a deterministic synthetic PDF of the given type and page count."""
+    rng = random.Random(f"{document_type}:{pages}:{seed}")
+    return pdf_from_pages(_GENERATORS[document_type](rng, pages))
+
+
+def pdf_from_pages(texts) -> bytes:
+    """A PDF with one page per string in `texts`."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for text in texts:
+        page = doc.new_page()
+        fontsize = 9
+        # insert_textbox writes nothing when the text overflows, so shrink to fit.
+        while page.insert_textbox(fitz.Rect(40, 40, 570, 810), text, fontsize=fontsize) < 0 and fontsize > 4:
+            fontsize -= 1
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+# Stub models: same call signatures and output shapes as the transformers
+# pipelines and llama_cpp.Llama, with no weights, so the suite runs offline.
+
+class StubTokenClassifier:
+    def __call__(self, text):
+        entities = []
+        for index, word in enumerate(text.split()[:20]):
+            if word[:1].isupper():
+                entities.append({
+                    'entity': 'I-ORG', 'score': 0.9, 'index': index,
+                    'word': word, 'start': 0, 'end': len(word)
+                })
+        return entities
+
+
+class StubSummarizer:
+    def __call__(self, text, max_length=150, min_length=50):
+        return [{'summary_text': " ".join(text.split()[:max_length])}]
+
+
+class StubQuestionAnswerer:
+    def __call__(self, inputs=None, **kwargs):
+        inputs = inputs or kwargs
+        context = inputs['context']
+        end = context.find('.') + 1 or min(len(context), 80)
+        return {'answer': context[:end], 'score': 0.5, 'start': 0, 'end': end}
+
+
+class StubLlama:
+    def __call__(self, prompt, max_tokens=1024, stop=None):
+        words = prompt.split()[-64:]
+        return {
+            'choices': [{'text': " ".join(words)}],
+            'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(words)}
+        }
+
+
+class StubBatchedPipeline:
+    """
+    Wraps a stub with the cost profile of a CPU forward pass: a fixed
+    overhead per call plus a smaller cost per input, so batching pays off
+    the way it does for real matmuls.
+    """
+
+    def __init__(self, single, task, overhead_ms=20.0, per_item_ms=2.0):
+        self.single = single
+        self.task = task
+        self.overhead = overhead_ms / 1000
+        self.per_item = per_item_ms / 1000
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        batch = inputs if isinstance(inputs, list) else [inputs]
+        time.sleep(self.overhead + self.per_item * len(batch))
+        if isinstance(inputs, list):
+            return [self.single(item, **kwargs) for item in inputs]
+        return self.single(inputs, **kwargs)
+
+
+def stub_models():
+    return {
+        'invoice': StubTokenClassifier(),
+        'resume': StubTokenClassifier(),
+        'research_paper': StubSummarizer(),
+        'qa': StubQuestionAnswerer(),
+        'other': StubLlama(),
+    }
+
+
+def timed_stub_models(overhead_ms=20.0, per_item_ms=2.0):
+    """Stub models that take time like real ones, for the batching benchmark."""
+    models = stub_models()
+    models['invoice'] = StubBatchedPipeline(models['invoice'], 'token-classification', overhead_ms, per_item_ms)
+    models['resume'] = StubBatchedPipeline(models['resume'], 'token-classification', overhead_ms, per_item_ms)
+    models['qa'] = StubBatchedPipeline(models['qa'], 'question-answering', overhead_ms, per_item_ms)
+    return models
+
+
+def peak_rss_mb() -> float:
+    """High-water RSS of the whole process so far; it never goes down, so it is reported per run."""
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def current_rss_mb():
+    """Resident set size right now, from /proc/self/statm; None where there is no /proc."""
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * resource.getpagesize() / (1024 * 1024)
+
+
+def _release_free_memory():
+    """Collect garbage and hand freed heap back to the OS, so RSS is close to live memory."""
+    gc.collect()
+    try:
+        ctypes.CDLL(None).malloc_trim(0)
+    except (AttributeError, OSError):
+        pass  # not glibc
+
+
+def stage_rss_mb(fn, interval=0.001) -> float:
+    """
+    Peak RSS growth while `fn` runs once: RSS is sampled from a background
+    thread every `interval` seconds and compared with the RSS `fn` started
+    from, so native buffers (MuPDF, torch tensors) are counted. Freed memory
+    is returned to the OS first, so earlier stages' leftovers are not reused
+    unseen. Without /proc this falls back to the rise in the process
+    high-water mark, which only shows stages that raise it.
+    """
+    _release_free_memory()
+    start = current_rss_mb()
+    if start is None:
+        before = peak_rss_mb()
+        fn()
+        return round(max(peak_rss_mb() - before, 0), 1)
+
+    peak = start
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(interval):
+            peak = max(peak, current_rss_mb())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        fn()
+    finally:
+        done.set()
+        sampler.join()
+    peak = max(peak, current_rss_mb())
+    return round(peak - start, 3)
+
+
+def summarize(samples, units=1, peak_rss=None):
+    """
+    Latency percentiles (ms) and throughput for a list of durations in
+    seconds, with the stage's peak RSS growth when measured.
+    """
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        'runs': len(ordered),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+        'p50_ms': round(pct(50) * 1000, 3),
+        'p99_ms': round(pct(99) * 1000, 3),
+        'throughput_per_s': round(len(ordered) * units / total, 3) if total else None,
+        'peak_rss_mb': peak_rss,
+    }
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _measure(fn, repeat, units=1):
+    """summarize() of `repeat` timed runs plus one sampled run, done first, for peak RSS."""
+    peak_rss = stage_rss_mb(fn)
+    return summarize(_timed(fn, repeat), units=units, peak_rss=peak_rss)
+
+
+def _process_lazily(process, pdf):
+    """Run `process` on lazily parsed pages; returns how many pages it parsed."""
+    from .pdf import DocumentPages
+
+    with DocumentPages(pdf) as pages:
+        process(pages)
+        return pages.pages_parsed
+
+
+def benchmark_processor(processor, corpus, repeat=3, custom_prompt="Summarize the key facts."):
+    """
+    Time each DocumentProcessor stage on every corpus entry, and the
+    lazy path that parses only the pages the document type's fields need.
+    `corpus` is a list of (document_type, pages, pdf_bytes).
+    """
+    results = []
+    for document_type, pages, pdf in corpus:
+        text = processor.extract_text_from_pdf(pdf)
+        process = {
+            'invoice': processor.process_invoice,
+            'resume': processor.process_resume,
+            'research_paper': processor.process_research_paper,
+        }[document_type]
+        stages = {
+            'extract_text': _measure(lambda: processor.extract_text_from_pdf(pdf), repeat, units=pages),
+            f'process_{document_type}': _measure(lambda: process(text), repeat),
+            f'lazy_{document_type}': _measure(lambda: _process_lazily(process, pdf), repeat),
+            'process_custom': _measure(lambda: processor.process_custom(text, custom_prompt), repeat),
+            'answer_question': _measure(
+                lambda: processor.answer_question(text, "What is this document about?"), repeat
+            ),
+        }
+        results.append({
+            'document_type': document_type,
+            'pages': pages,
+            'bytes': len(pdf),
+            'text_chars': len(text),
+            'pages_parsed_lazily': _process_lazily(process, pdf),
+            'stages': stages,
+        })
+    return results
+
+
+def benchmark_batching(models_factory, configs, concurrency=16, requests=128, text=None):
+    """
+    Measure the throughput/latency tradeoff of micro-batching: fire
+    `requests` NER and QA calls from `concurrency` threads for each
+    (max_batch_size, max_wait_ms) config. A batch size of 1 is the
+    unbatched baseline: the threads call the raw pipelines concurrently,
+    with no batcher thread in between.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .ai_processor import DocumentProcessor
+    from .batching import disable_batching, enable_batching
+    from .pdf import first_page_text
+
+    if text is None:
+        text = first_page_text(generate_pdf('invoice', 1))
+    calls = {
+        'ner': lambda processor: processor.process_invoice(text),
+        'qa': lambda processor: processor.answer_question(text, "What is the total?"),
+    }
+    results = []
+    for max_batch_size, max_wait_ms in configs:
+        processor = disable_batching(DocumentProcessor(models=models_factory()))
+        if max_batch_size > 1:
+            enable_batching(processor, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        else:
+            max_wait_ms = None
+        try:
+            for name, call in calls.items():
+                def timed_call(_):
+                    start = time.perf_counter()
+                    call(processor)
+                    return time.perf_counter() - start
+
+                wall_start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    latencies = list(executor.map(timed_call, range(requests)))
+                wall = time.perf_counter() - wall_start
+                stats = summarize(latencies)
+                stats['throughput_per_s'] = round(requests / wall, 3)
+                results.append({
+                    'pipeline': name,
+                    'max_batch_size': max_batch_size,
+                    'max_wait_ms': max_wait_ms,
+                    'concurrency': concurrency,
+                    **stats,
+                })
+        finally:
+            disable_batching(processor)
+    return results
+
+
+@contextmanager
+def _isolated_environment():
+    """Throwaway test database and media directory for the HTTP benchmark."""
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+    media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+    storages = {
+        **settings.STORAGES,
+        'documents': {
+            'BACKEND': 'extraction.storage.ShardedFileSystemStorage',
+            'OPTIONS': {'location': media_root},
+        },
+    }
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        # Repeated uploads from one user would otherwise drain the extraction
+        # quota and time 429s instead of the pipeline.
+        quota = {'capacity': 1e12, 'refill_per_second': 1e12}
+        with override_settings(MEDIA_ROOT=media_root, STORAGES=storages,
+                               UPLOAD_STAGING_DIR=f"{media_root}/uploads", EXTRACTION_QUOTA=quota,
+                               ANSWER_CACHE_PREFILL_QUESTIONS={}):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def benchmark_http(corpus, repeat=3):
+    """Time the upload, list, detail and ask endpoints through the full Django stack."""
+    from django.contrib.auth.models import User
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from rest_framework.test import APIClient
+
+    results = []
+    with _isolated_environment():
+        user = User.objects.create_user(username='benchmark@example.com', password='benchmark')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        for document_type, pages, pdf in corpus:
+            document_ids = []
+
+            def upload():
+                response = client.post('/api/extract/', {
+                    'file': SimpleUploadedFile(f'{document_type}-{pages}.pdf', pdf, 'application/pdf'),
+                    'document_type': document_type,
+                }, format='multipart')
+                assert response.status_code == 200, response.content[:200]
+                document_ids.append(response.json()['document_id'])
+
+            endpoints = {'extract': _measure(upload, repeat, units=pages)}
+            document_id = document_ids[-1]
+            endpoints['documents'] = _measure(lambda: client.get('/api/documents/'), repeat)
+            endpoints['document_detail'] = _measure(
+                lambda: client.get(f'/api/documents/{document_id}/'), repeat
+            )
+            endpoints['ask_question'] = _measure(
+                lambda: client.post(f'/api/documents/{document_id}/ask_question/',
+                                    {'question': 'What is the total?'}, format='json'),
+                repeat
+            )
+            results.append({'document_type': document_type, 'pages': pages, 'endpoints': endpoints})
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info():
+    import fitz  # PyMuPDF
+
+    return {
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pymupdf': fitz.VersionBind,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'peak_rss_mb_at_start': peak_rss_mb(),
+    }
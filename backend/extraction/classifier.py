@@ -0,0 +1,208 @@
+"""
+Cheap document type classifier.
+
+A multinomial logistic regression over hashed word/bigram features plus
+keyword and pattern counts, run on the first page's text before any model
+is touched. Pure Python and a few milliseconds per document. Weights are
+trained offline with `python manage.py train_classifier` and shipped in
+classifier_weights.json.
+"""
+import json
+import logging
+import math
+import random
+import re
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+from .metrics import stage
+from .pdf import DocumentPages, first_page_text
+
+AUTO_DOCUMENT_TYPE = 'auto'
+LABELS = ('invoice', 'resume', 'research_paper')
+N_FEATURES = 2 ** 18
+MAX_CHARS = 4000
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHTS_PATH = Path(__file__).resolve().parent / 'classifier_weights.json'
+
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9']+")
+_KEYWORDS = {
+    'invoice': (
+        'invoice', 'bill to', 'ship to', 'total', 'subtotal', 'amount due', 'due date', 'qty',
+        'quantity', 'tax', 'vat', 'payment', 'unit price', 'balance', 'purchase order',
+    ),
+    'resume': (
+        'experience', 'education', 'skills', 'university', 'bachelor', 'master', 'engineer',
+        'curriculum vitae', 'objective', 'certifications', 'linkedin', 'employment', 'projects',
+    ),
+    'research_paper': (
+        'abstract', 'keywords', 'introduction', 'references', 'conclusion', 'related work',
+        'et al', 'doi', 'methodology', 'journal', 'proceedings', 'arxiv', 'experiments',
+    ),
+}
+_KEYWORD_RES = {
+    label: re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in words) + r')\b')
+    for label, words in _KEYWORDS.items()
+}
+_PATTERNS = {
+    'currency': re.compile(r'[$€£]\s?\d'),
+    'email': re.compile(r'[\w.+-]+@[\w-]+\.\w+'),
+    'phone': re.compile(r'\d{3}[-.\s]\d{3}[-.\s]\d{4}'),
+    'date': re.compile(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b'),
+    'citation': re.compile(r'\[\d+(?:,\s*\d+)*\]'),
+}
+
+
+def _index(feature):
+    return zlib.crc32(feature.encode()) % N_FEATURES
+
+
+def features(text):
+    """
+    Sparse {hashed feature index: value} for `text`: an L2-normalized bag of
+    words and bigrams, plus keyword and pattern counts kept on their own
+    scale so unfamiliar vocabulary does not drown them out.
+    """
+    text = text[:MAX_CHARS].lower()
+    tokens = _TOKEN_RE.findall(text)
+    counts = Counter(f"w:{token}" for token in tokens)
+    counts.update(f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:]))
+
+    vector = {}
+    for feature, count in counts.items():
+        index = _index(feature)
+        vector[index] = vector.get(index, 0.0) + 1.0 + math.log(count)
+    norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+    vector = {index: value / norm for index, value in vector.items()}
+
+    signals = [(f"kw:{label}", pattern) for label, pattern in _KEYWORD_RES.items()]
+    signals += [(f"re:{name}", pattern) for name, pattern in _PATTERNS.items()]
+    for feature, pattern in signals:
+        hits = len(pattern.findall(text))
+        if hits:
+            index = _index(feature)
+            vector[index] = vector.get(index, 0.0) + math.log1p(hits)
+    return vector
+
+
+def _softmax(logits):
+    top = max(logits.values())
+    exps = {label: math.exp(value - top) for label, value in logits.items()}
+    total = sum(exps.values())
+    return {label: value / total for label, value in exps.items()}
+
+
+class DocumentClassifier:
+    def __init__(self, labels=LABELS, bias=None, weights=None):
+        self.labels = tuple(labels)
+        self.bias = dict(bias or {label: 0.0 for label in self.labels})
+        self.weights = {label: dict((weights or {}).get(label, {})) for label in self.labels}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('n_features') != N_FEATURES:
+            raise ValueError(f"Classifier weights in {path} were trained for a different feature space")
+        weights = {label: {int(k): v for k, v in w.items()} for label, w in data['weights'].items()}
+        return cls(data['labels'], data['bias'], weights)
+
+    def save(self, path):
+        data = {
+            'n_features': N_FEATURES,
+            'labels': list(self.labels),
+            'bias': {label: round(value, 6) for label, value in self.bias.items()},
+            'weights': {
+                label: {str(k): round(v, 6) for k, v in sorted(w.items()) if abs(v) >= 1e-6}
+                for label, w in self.weights.items()
+            },
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    def probabilities(self, vector):
+        logits = {
+            label: self.bias[label] + sum(self.weights[label].get(i, 0.0) * v for i, v in vector.items())
+            for label in self.labels
+        }
+        return _softmax(logits)
+
+    def classify(self, text):
+        """{'document_type', 'confidence', 'scores'} for the given first-page text."""
+        scores = self.probabilities(features(text))
+        best = max(scores, key=scores.get)
+        return {
+            'document_type': best,
+            'confidence': round(scores[best], 4),
+            'scores': {label: round(score, 4) for label, score in scores.items()},
+        }
+
+    def fit(self, samples, epochs=15, learning_rate=0.5, l2=1e-4, seed=0):
+        """
+        Train on (text, label) pairs with plain SGD on the cross-entropy
+        loss. Labels outside self.labels are ignored.
+        """
+        data = [(features(text), label) for text, label in samples if label in self.labels]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch)
+            for vector, label in data:
+                probs = self.probabilities(vector)
+                for candidate in self.labels:
+                    gradient = probs[candidate] - (1.0 if candidate == label else 0.0)
+                    self.bias[candidate] -= rate * gradient
+                    weights = self.weights[candidate]
+                    for index, value in vector.items():
+                        current = weights.get(index, 0.0)
+                        weights[index] = current - rate * (gradient * value + l2 * current)
+        return self
+
+    def accuracy(self, samples):
+        samples = [(text, label) for text, label in samples if label in self.labels]
+        if not samples:
+            return None
+        correct = sum(self.classify(text)['document_type'] == label for text, label in samples)
+        return correct / len(samples)
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier():
+    """The shipped classifier, loaded once; None if no weights are available."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                path = getattr(settings, 'CLASSIFIER_WEIGHTS_PATH', None) or DEFAULT_WEIGHTS_PATH
+                try:
+                    _classifier = DocumentClassifier.load(path)
+                except (OSError, ValueError, KeyError):
+                    return None
+    return _classifier
+
+
+def classify_pdf(source):
+    """
+    Classify a PDF (a source or its DocumentPages) from its first page; None
+    without a classifier or readable page.
+    """
+    classifier = get_classifier()
+    if classifier is None:
+        return None
+    try:
+        with stage('classify'):
+            if isinstance(source, DocumentPages):
+                return classifier.classify(source.header) if len(source) else None
+            return classifier.classify(first_page_text(source))
+    except Exception as e:
+        logger.warning(f"Could not classify document: {e}")
+        return None
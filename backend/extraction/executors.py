@@ -0,0 +1,161 @@
+"""
+Bounded, fair-share thread pools for PDF parsing and model calls.
+
+Each executor admits at most `max_workers + max_queue` tasks. Past that,
+submit() raises ExecutorBusy instead of queueing without limit, and views
+turn it into 503 with Retry-After so clients back off.
+
+Waiting tasks are queued per owner (the requesting user) and workers take
+them round-robin across owners, so a user with hundreds of queued documents
+delays someone else's next task by at most one task per worker. An owner
+may also hold at most `max_queue_per_user` waiting tasks; running tasks do
+not count, so a lone heavy user still gets every idle worker. Work sent
+here must not touch the database; use the ORM around it.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .metrics import EXECUTOR_REJECTIONS, record_queue_wait
+
+
+class ExecutorBusy(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"Executor {name} is at capacity")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    def __init__(self, name, max_workers=4, max_queue=32, retry_after=5, max_queue_per_user=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.retry_after = retry_after
+        self.capacity = max_workers + max_queue
+        self.max_queue_per_user = max(1, max_queue_per_user if max_queue_per_user is not None else max_queue)
+        self._pending = {}  # owner -> deque of waiting tasks
+        self._ready = deque()  # owners with waiting tasks, in service order
+        self._admitted = 0  # waiting + running
+        self._idle = 0
+        self._workers = []
+        self._shutdown = False
+        self._condition = threading.Condition()
+
+    def submit_for(self, owner, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` on behalf of `owner` and return its Future."""
+        future = Future()
+        task = (future, contextvars.copy_context(), time.perf_counter(), fn, args, kwargs)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError(f"Executor {self.name} has been shut down")
+            queue = self._pending.get(owner)
+            if self._admitted >= self.capacity or (queue is not None and len(queue) >= self.max_queue_per_user):
+                EXECUTOR_REJECTIONS.inc(executor=self.name)
+                raise ExecutorBusy(self.name, self.retry_after)
+            if queue is None:
+                queue = self._pending[owner] = deque()
+                self._ready.append(owner)
+            queue.append(task)
+            self._admitted += 1
+            if self._idle:
+                # Claim the idle worker now: it only wakes after this lock is
+                # released, so later submits in a burst must not count it.
+                self._idle -= 1
+                self._condition.notify()
+            elif len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._work, name=f"{self.name}-worker-{len(self._workers)}", daemon=True
+                )
+                self._workers.append(worker)
+                worker.start()
+        return future
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submit_for(None, fn, *args, **kwargs)
+
+    def call_for(self, owner, fn, *args, **kwargs):
+        """Run `fn` on the pool for `owner` and block until it returns."""
+        return self.submit_for(owner, fn, *args, **kwargs).result()
+
+    async def run_for(self, owner, fn, *args, **kwargs):
+        """Run `fn` on the pool for `owner` and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit_for(owner, fn, *args, **kwargs))
+
+    async def run(self, fn, *args, **kwargs):
+        return await self.run_for(None, fn, *args, **kwargs)
+
+    def _next_task(self):
+        with self._condition:
+            while not self._ready:
+                if self._shutdown:
+                    return None
+                # submit_for() takes us off the idle count when it notifies.
+                self._idle += 1
+                self._condition.wait()
+            owner = self._ready.popleft()
+            queue = self._pending[owner]
+            task = queue.popleft()
+            if queue:
+                self._ready.append(owner)
+            else:
+                del self._pending[owner]
+            return task
+
+    def _work(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            future, context, submitted, fn, args, kwargs = task
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = context.run(self._call, submitted, fn, args, kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self._condition:
+                    self._admitted -= 1
+
+    def _call(self, submitted, fn, args, kwargs):
+        record_queue_wait(self.name, time.perf_counter() - submitted)
+        return fn(*args, **kwargs)
+
+    def shutdown(self, wait=True):
+        """Stop accepting work; workers exit once the queued tasks are done."""
+        with self._condition:
+            self._shutdown = True
+            self._idle = 0
+            self._condition.notify_all()
+        if wait:
+            for worker in list(self._workers):
+                worker.join()
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name) -> BoundedExecutor:
+    """Executor configured under settings.PROCESSING_EXECUTORS[name], created on first use."""
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                config = settings.PROCESSING_EXECUTORS.get(name, {})
+                executor = _executors[name] = BoundedExecutor(
+                    name,
+                    max_workers=config.get('max_workers', 4),
+                    max_queue=config.get('max_queue', 32),
+                    retry_after=config.get('retry_after', 5),
+                    max_queue_per_user=config.get('max_queue_per_user')
+                )
+    return executor
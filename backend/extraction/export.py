@@ -0,0 +1,175 @@
+"""
+Streaming export of extraction results.
+
+Rows come from a chunked database iterator and are encoded one chunk at a
+time, so memory stays flat however many documents are exported. Filtered to
+a single document type, extracted_data is flattened into one column per
+field of that type's schema; mixed exports keep it as a JSON column.
+"""
+import csv
+import io
+import json
+import typing
+
+from django.conf import settings
+
+from .models import ExtractionResult
+from .schemas import EXTRACTION_SCHEMAS
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+BASE_COLUMNS = ['document_id', 'title', 'document_type', 'uploaded_at', 'processing_time']
+
+
+class ExportError(Exception):
+    pass
+
+
+def _is_number(annotation):
+    return any(arg in (int, float) for arg in (typing.get_args(annotation) or (annotation,)))
+
+
+def export_columns(document_type=None):
+    """Column names and whether each holds numbers, for one document type or a mixed export."""
+    columns = [(name, name in ('document_id', 'processing_time')) for name in BASE_COLUMNS]
+    schema = EXTRACTION_SCHEMAS.get(document_type)
+    if schema is None:
+        return columns + [('extracted_data', False)]
+    return columns + [(name, _is_number(field.annotation)) for name, field in schema.model_fields.items()]
+
+
+def _flatten_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return '; '.join(value)
+    return json.dumps(value, default=str)
+
+
+def _number(value):
+    try:
+        return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def flatten_row(row, columns):
+    document_id, title, document_type, uploaded_at, processing_time, extracted_data = row
+    flat = {
+        'document_id': document_id,
+        'title': title,
+        'document_type': document_type,
+        'uploaded_at': uploaded_at.isoformat() if uploaded_at else None,
+        'processing_time': processing_time,
+    }
+    extracted_data = extracted_data or {}
+    for name, numeric in columns[len(BASE_COLUMNS):]:
+        if name == 'extracted_data':
+            flat[name] = json.dumps(extracted_data, default=str)
+        else:
+            value = extracted_data.get(name)
+            flat[name] = _number(value) if numeric else _flatten_value(value)
+    return flat
+
+
+def export_queryset(user, document_type=None, since=None, until=None):
+    results = ExtractionResult.objects.filter(document__user=user)
+    if document_type:
+        results = results.filter(document__document_type=document_type)
+    if since:
+        results = results.filter(document__uploaded_at__gte=since)
+    if until:
+        results = results.filter(document__uploaded_at__lt=until)
+    return results.order_by('document__uploaded_at', 'document_id').values_list(
+        'document_id', 'document__title', 'document__document_type',
+        'document__uploaded_at', 'processing_time', 'extracted_data'
+    )
+
+
+def iter_rows(queryset, columns):
+    for row in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield flatten_row(row, columns)
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns):
+    writer = csv.writer(_Echo())
+    names = [name for name, _ in columns]
+    yield writer.writerow(names)
+    for row in rows:
+        yield writer.writerow(['' if row[name] is None else row[name] for name in names])
+
+
+def stream_ndjson(rows, columns):
+    for row in rows:
+        yield json.dumps(row, default=str) + '\n'
+
+
+def _parquet_modules():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError('Parquet export requires pyarrow to be installed')
+    return pyarrow, pyarrow.parquet
+
+
+def stream_parquet(rows, columns):
+    pa, pq = _parquet_modules()
+    schema = pa.schema([
+        (name, pa.int64() if name == 'document_id' else pa.float64() if numeric else pa.string())
+        for name, numeric in columns
+    ])
+    sink = io.BytesIO()
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    batch = []
+    with pq.ParquetWriter(sink, schema) as writer:
+        for row in rows:
+            batch.append({
+                name: row[name] if numeric or row[name] is None else str(row[name])
+                for name, numeric in columns
+            })
+            if len(batch) >= settings.EXPORT_CHUNK_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+                yield drain()
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    yield drain()
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+    'parquet': stream_parquet,
+}
+
+
+def export_stream(export_format, user, document_type=None, since=None, until=None):
+    """Return (content_type, filename extension, iterator of encoded chunks)."""
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if document_type and document_type not in EXTRACTION_SCHEMAS:
+        raise ExportError(f"Unknown document type '{document_type}'")
+    if export_format == 'parquet':
+        _parquet_modules()
+    columns = export_columns(document_type)
+    rows = iter_rows(export_queryset(user, document_type, since, until), columns)
+    content_type, extension = EXPORT_FORMATS[export_format]
+    return content_type, extension, STREAMERS[export_format](rows, columns)
@@ -0,0 +1,106 @@
+"""
+Processor access for web workers.
+
+With INFERENCE_SERVER_URL set, model calls go to the inference server and
+this process never imports the ML stack. Otherwise the in-process
+DocumentProcessor from ai_processor is used.
+"""
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+
+from .metrics import stage
+from .pdf import DocumentPages, extract_text
+from .schemas import load_extraction
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceUnavailable(Exception):
+    """
+    The inference server could not serve a call. `status` is its HTTP
+    status when it answered with an error, None when it was unreachable or
+    timed out.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class RemoteProcessor:
+    """Same interface as DocumentProcessor, backed by the inference server."""
+
+    def __init__(self, base_url, timeout=300):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _call(self, method, **payload):
+        request = urllib.request.Request(
+            f"{self.base_url}/{method}",
+            data=json.dumps(payload).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())['result']
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', str(e))
+            except ValueError:
+                message = str(e)
+            raise InferenceUnavailable(f"Inference server error on {method}: {message}", status=e.code)
+        except (urllib.error.URLError, OSError) as e:
+            raise InferenceUnavailable(f"Inference server unreachable at {self.base_url}: {e}")
+
+    def extract_text_from_pdf(self, source) -> str:
+        # PDF parsing needs no models, so it stays in the web worker.
+        try:
+            with stage('extract_text'):
+                return extract_text(source)
+        except Exception as e:
+            logger.error(f"Error extracting text from PDF: {e}")
+            return ""
+
+    # The server works on plain text, so lazily parsed pages are sent whole.
+    def process_invoice(self, text):
+        return load_extraction('invoice', self._call('process_invoice', text=DocumentPages.of(text).text))
+
+    def process_resume(self, text):
+        return load_extraction('resume', self._call('process_resume', text=DocumentPages.of(text).text))
+
+    def process_research_paper(self, text):
+        return load_extraction(
+            'research_paper', self._call('process_research_paper', text=DocumentPages.of(text).text)
+        )
+
+    def process_custom(self, text, prompt):
+        return load_extraction('other', self._call('process_custom', text=DocumentPages.of(text).text, prompt=prompt))
+
+    def answer_question(self, text, question):
+        return self._call('answer_question', text=text, question=question)
+
+    def answer_questions(self, text, questions):
+        return self._call('answer_questions', text=text, questions=questions)
+
+
+_remote = None
+_remote_lock = threading.Lock()
+
+
+def get_processor():
+    global _remote
+    url = getattr(settings, 'INFERENCE_SERVER_URL', None)
+    if not url:
+        from .ai_processor import get_processor as get_local_processor
+        return get_local_processor()
+    if _remote is None or _remote.base_url != url.rstrip('/'):
+        with _remote_lock:
+            if _remote is None or _remote.base_url != url.rstrip('/'):
+                _remote = RemoteProcessor(url, timeout=getattr(settings, 'INFERENCE_SERVER_TIMEOUT', 300))
+    return _remote
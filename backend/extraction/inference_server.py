@@ -0,0 +1,113 @@
+"""
+Standalone inference server that owns the models.
+
+Web workers talk to it over local HTTP (see inference_client.RemoteProcessor)
+so they never import torch or hold model weights themselves. Requests from
+all callers share one DocumentProcessor whose pipelines are micro-batched.
+"""
+import json
+import logging
+import sys
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pydantic import BaseModel
+
+from .metrics import render_metrics
+
+logger = logging.getLogger(__name__)
+
+# Processor methods callable over the wire, with their argument names.
+METHODS = {
+    'process_invoice': ('text',),
+    'process_resume': ('text',),
+    'process_research_paper': ('text',),
+    'process_custom': ('text', 'prompt'),
+    'answer_question': ('text', 'question'),
+    'answer_questions': ('text', 'questions'),
+}
+
+
+def _json_default(value):
+    # numpy scalars and arrays returned by pipelines outside the schemas
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'DocExtractorInference/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body, content_type='application/json'):
+        payload = body if isinstance(body, bytes) else json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == '/health':
+            models = sorted(name for name, model in self.server.processor.models.items() if model is not None)
+            self._send(HTTPStatus.OK, {'status': 'ok', 'models': models})
+        elif self.path == '/metrics':
+            self._send(HTTPStatus.OK, render_metrics().encode(), 'text/plain; version=0.0.4; charset=utf-8')
+        else:
+            self._send(HTTPStatus.NOT_FOUND, {'error': 'Not found'})
+
+    def do_POST(self):
+        method = self.path.strip('/')
+        if method not in METHODS:
+            self._send(HTTPStatus.NOT_FOUND, {'error': f'Unknown method {method}'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            args = [payload[name] for name in METHODS[method]]
+        except (ValueError, KeyError) as e:
+            self._send(HTTPStatus.BAD_REQUEST, {'error': f'Invalid request: {e}'})
+            return
+        try:
+            result = getattr(self.server.processor, method)(*args)
+        except Exception as e:
+            logger.error(f"Inference call {method} failed: {e}")
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+            return
+        if isinstance(result, BaseModel):
+            # Typed extraction output is encoded by pydantic-core in one pass.
+            self._send(HTTPStatus.OK, b'{"result":' + result.model_dump_json().encode() + b'}')
+        else:
+            self._send(HTTPStatus.OK, {'result': result})
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, processor):
+        self.processor = processor
+        super().__init__(address, InferenceRequestHandler)
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            # The caller timed out or hung up before the result was ready.
+            logger.debug(f"Client {client_address[0]} disconnected before the response was sent")
+        else:
+            logger.exception(f"Error serving inference request from {client_address[0]}")
+
+
+def serve(host='127.0.0.1', port=8765, processor=None):
+    if processor is None:
+        from .ai_processor import get_processor
+        processor = get_processor()
+    server = InferenceServer((host, port), processor)
+    logger.info(f"Inference server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,130 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from extraction import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the extraction pipeline on a synthetic PDF corpus and write "
+        "throughput, p50/p99 latency and peak RSS growth per stage as JSON."
+    )
+    # System checks import the URLconf, which must not load the real models
+    # before stub models are installed.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', default=','.join(benchmark.DOCUMENT_TYPES),
+                            help='Comma-separated document types to generate')
+        parser.add_argument('--pages', default='1,10,100',
+                            help='Comma-separated page counts per document (1 to 1000)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic corpus')
+        parser.add_argument('--real-models', action='store_true',
+                            help='Use the real transformers/Mistral models instead of offline stubs')
+        parser.add_argument('--skip-http', action='store_true', help='Only benchmark DocumentProcessor stages')
+        parser.add_argument('--batching', action='store_true',
+                            help='Also sweep micro-batching configs under concurrent load')
+        parser.add_argument('--batch-sizes', default='1,4,8,16',
+                            help='max_batch_size values for --batching (1 = unbatched baseline, calling the raw pipelines)')
+        parser.add_argument('--wait-ms', default='0,2,5,10', help='max_wait_ms values for --batching')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent callers for --batching')
+        parser.add_argument('--requests', type=int, default=128, help='Calls per config for --batching')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        types = [t.strip() for t in options['types'].split(',') if t.strip()]
+        unknown = set(types) - set(benchmark.DOCUMENT_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown document types: {', '.join(sorted(unknown))}")
+        try:
+            pages = [int(p) for p in options['pages'].split(',')]
+        except ValueError:
+            raise CommandError('--pages must be a comma-separated list of integers')
+        if any(p < 1 or p > 1000 for p in pages):
+            raise CommandError('--pages values must be between 1 and 1000')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        try:
+            batch_sizes = [int(b) for b in options['batch_sizes'].split(',')]
+            wait_ms = [float(w) for w in options['wait_ms'].split(',')]
+        except ValueError:
+            raise CommandError('--batch-sizes and --wait-ms must be comma-separated numbers')
+
+        from extraction.ai_processor import DocumentProcessor, get_processor, set_processor
+
+        from extraction.batching import BatchedPipeline
+
+        if options['real_models']:
+            processor = get_processor()
+        else:
+            processor = DocumentProcessor(models=benchmark.stub_models())
+            set_processor(processor)
+
+        self.stdout.write(f"Generating corpus: types={types} pages={pages}")
+        corpus = [
+            (document_type, count, benchmark.generate_pdf(document_type, count, seed=options['seed']))
+            for document_type in types
+            for count in pages
+        ]
+
+        report = {
+            'environment': benchmark.environment_info(),
+            'config': {
+                'types': types,
+                'pages': pages,
+                'repeat': options['repeat'],
+                'seed': options['seed'],
+                'models': 'real' if options['real_models'] else 'stub',
+            },
+        }
+
+        self.stdout.write("Benchmarking DocumentProcessor stages...")
+        report['processor'] = benchmark.benchmark_processor(processor, corpus, repeat=options['repeat'])
+        if not options['skip_http']:
+            self.stdout.write("Benchmarking HTTP endpoints...")
+            report['http'] = benchmark.benchmark_http(corpus, repeat=options['repeat'])
+        if options['batching']:
+            self.stdout.write("Benchmarking micro-batching...")
+            if options['real_models']:
+                raw_models = {
+                    name: model.pipeline if isinstance(model, BatchedPipeline) else model
+                    for name, model in processor.models.items()
+                }
+                models_factory = lambda: dict(raw_models)
+            else:
+                models_factory = benchmark.timed_stub_models
+            configs = [(1, None)] + [(b, w) for b in batch_sizes if b > 1 for w in wait_ms]
+            report['batching'] = benchmark.benchmark_batching(
+                models_factory, configs, concurrency=options['concurrency'], requests=options['requests']
+            )
+
+        for entry in report['processor']:
+            for stage, stats in entry['stages'].items():
+                self.stdout.write(
+                    f"{entry['document_type']:>15} {entry['pages']:>5}p {stage:<24} "
+                    f"p50={stats['p50_ms']:>10.2f}ms p99={stats['p99_ms']:>10.2f}ms "
+                    f"rss=+{stats['peak_rss_mb']}MB"
+                )
+        for entry in report.get('http', []):
+            for endpoint, stats in entry['endpoints'].items():
+                self.stdout.write(
+                    f"{entry['document_type']:>15} {entry['pages']:>5}p {endpoint:<24} "
+                    f"p50={stats['p50_ms']:>10.2f}ms p99={stats['p99_ms']:>10.2f}ms"
+                )
+
+        for entry in report.get('batching', []):
+            self.stdout.write(
+                f"{entry['pipeline']:>15} batch={entry['max_batch_size']:<3} wait={'-' if entry['max_wait_ms'] is None else entry['max_wait_ms']:<5}ms "
+                f"throughput={entry['throughput_per_s']:>8.1f}/s "
+                f"p50={entry['p50_ms']:>9.2f}ms p99={entry['p99_ms']:>9.2f}ms"
+            )
+
+        output = json.dumps(report, indent=2, default=str)
+        if options['output']:
+            Path(options['output']).write_text(output)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from extraction.uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete chunked upload sessions (and their staged files) that were abandoned or never cleaned up."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=settings.UPLOAD_SESSION_MAX_AGE,
+                            help='Seconds since the last chunk after which a session is stale')
+
+    def handle(self, *args, **options):
+        count = purge_stale_uploads(timedelta(seconds=options['max_age']))
+        self.stdout.write(f"Removed {count} stale upload session(s)")
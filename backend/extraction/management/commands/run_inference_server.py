@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from extraction.batching import disable_batching, enable_batching
+from extraction.inference_server import serve
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the standalone inference server that owns the models. Point web "
+        "workers at it with INFERENCE_SERVER_URL so they start without the ML stack."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--max-batch-size', type=int,
+                            help='Largest batch collected across concurrent callers '
+                                 '(default: INFERENCE_BATCHING setting)')
+        parser.add_argument('--max-wait-ms', type=float,
+                            help='How long to wait for a batch to fill before running it '
+                                 '(default: INFERENCE_BATCHING setting)')
+
+    def handle(self, *args, **options):
+        from extraction.ai_processor import get_processor
+
+        self.stdout.write("Loading models...")
+        # get_processor() already applies INFERENCE_BATCHING; explicit
+        # options re-wrap the pipelines with the requested limits.
+        processor = get_processor()
+        if options['max_batch_size'] is not None or options['max_wait_ms'] is not None:
+            disable_batching(processor)
+        processor = enable_batching(
+            processor,
+            max_batch_size=options['max_batch_size'],
+            max_wait_ms=options['max_wait_ms']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Inference server listening on http://{options['host']}:{options['port']}"
+        ))
+        serve(options['host'], options['port'], processor)
@@ -0,0 +1,73 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from extraction import benchmark
+from extraction.classifier import DEFAULT_WEIGHTS_PATH, LABELS, DocumentClassifier
+from extraction.pdf import first_page_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Train the document type classifier on first pages of the synthetic "
+        "benchmark corpus (and optionally stored uploads) and write its weights."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=120, help='Synthetic documents per type')
+        parser.add_argument('--holdout', type=float, default=0.2, help='Fraction kept back for evaluation')
+        parser.add_argument('--epochs', type=int, default=15)
+        parser.add_argument('--learning-rate', type=float, default=0.5)
+        parser.add_argument('--l2', type=float, default=1e-4)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--include-uploads', action='store_true',
+                            help='Also train on processed documents in the database, labelled by their type')
+        parser.add_argument('--output', default=str(DEFAULT_WEIGHTS_PATH), help='Where to write the weights JSON')
+
+    def _synthetic_samples(self, count, seed):
+        for document_type in LABELS:
+            for i in range(count):
+                pages = 1 + (i % 3)
+                pdf = benchmark.generate_pdf(document_type, pages, seed=seed * 100000 + i)
+                yield first_page_text(pdf), document_type
+
+    def _upload_samples(self):
+        from extraction.models import Document
+        from extraction.storage import open_document_buffer
+
+        for document in Document.objects.filter(processed=True, document_type__in=LABELS).iterator():
+            try:
+                with open_document_buffer(document) as buffer:
+                    yield first_page_text(buffer), document.document_type
+            except Exception as e:
+                self.stderr.write(f"Skipping document {document.pk}: {e}")
+
+    def handle(self, *args, **options):
+        if options['samples'] < 1:
+            raise CommandError('--samples must be at least 1')
+        if not 0 <= options['holdout'] < 1:
+            raise CommandError('--holdout must be in [0, 1)')
+
+        samples = list(self._synthetic_samples(options['samples'], options['seed']))
+        if options['include_uploads']:
+            samples.extend(self._upload_samples())
+
+        random.Random(options['seed']).shuffle(samples)
+        split = int(len(samples) * (1 - options['holdout']))
+        train, test = samples[:split], samples[split:]
+
+        classifier = DocumentClassifier().fit(
+            train,
+            epochs=options['epochs'],
+            learning_rate=options['learning_rate'],
+            l2=options['l2'],
+            seed=options['seed']
+        )
+        classifier.save(options['output'])
+
+        self.stdout.write(f"Trained on {len(train)} documents, evaluated on {len(test)}")
+        self.stdout.write(f"Train accuracy: {classifier.accuracy(train):.3f}")
+        if test:
+            self.stdout.write(f"Holdout accuracy: {classifier.accuracy(test):.3f}")
+        self.stdout.write(self.style.SUCCESS(f"Weights written to {options['output']}"))
@@ -0,0 +1,200 @@
+"""
+In-process instrumentation for the extraction pipeline.
+
+Metrics are kept per process and rendered in the Prometheus text exposition
+format by the /metrics view. `stage()` also records into the per-document
+breakdown opened by `collect_stages()`, which is stored on ExtractionResult.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            buckets, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    buckets[i] += 1
+            self._values[key] = (buckets, total + value, count + 1)
+
+    def render(self):
+        with self._lock:
+            values = {k: (list(b), t, c) for k, (b, t, c) in self._values.items()}
+        for key, (buckets, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, buckets):
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {bucket_count}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+STAGE_SECONDS = Histogram(
+    'extraction_stage_seconds', 'Time spent in each extraction pipeline stage', ['stage']
+)
+MODEL_CALL_SECONDS = Histogram(
+    'extraction_model_call_seconds', 'Latency of individual model calls', ['model']
+)
+MODEL_LOAD_SECONDS = Histogram(
+    'extraction_model_load_seconds', 'Time taken to load each model', ['model'],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    'extraction_llm_tokens_per_second', 'Mistral generation throughput per chunk', ['model'],
+    buckets=(0.5, 1, 2, 5, 10, 20, 50, 100, 200)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    'extraction_queue_wait_seconds', 'Time work spent queued before a worker picked it up', ['queue']
+)
+BATCH_SIZE = Histogram(
+    'extraction_batch_size', 'Inputs per batched model forward pass', ['pipeline'],
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+CACHE_REQUESTS = Counter(
+    'extraction_cache_requests_total', 'Cache lookups by cache and outcome', ['cache', 'result']
+)
+DOCUMENTS_PROCESSED = Counter(
+    'extraction_documents_total', 'Documents run through the pipeline', ['document_type', 'status']
+)
+EXECUTOR_REJECTIONS = Counter(
+    'extraction_executor_rejections_total', 'Work turned away because an executor was full', ['executor']
+)
+PDF_PAGES = Counter(
+    'extraction_pdf_pages_total', 'Pages of extracted PDFs, by whether extraction had to parse them',
+    ['document_type', 'parsed']
+)
+QUOTA_REJECTIONS = Counter(
+    'extraction_quota_rejections_total', 'Requests refused because the user had used up their quota', ['endpoint']
+)
+
+_breakdown = contextvars.ContextVar('extraction_stage_breakdown', default=None)
+
+
+@contextmanager
+def collect_stages():
+    """
+    Collect per-stage seconds for the current document into a dict. Nested
+    calls share the outermost breakdown.
+    """
+    current = _breakdown.get()
+    if current is not None:
+        yield current
+        return
+    breakdown = {}
+    token = _breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _breakdown.reset(token)
+
+
+def _record_stage(name, elapsed):
+    STAGE_SECONDS.observe(elapsed, stage=name)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown[name] = round(breakdown.get(name, 0.0) + elapsed, 6)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def model_call(model):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        MODEL_CALL_SECONDS.observe(elapsed, model=model)
+        _record_stage(f"model.{model}", elapsed)
+
+
+@contextmanager
+def model_load(model):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, model=model)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def record_queue_wait(queue, waited):
+    """
+    Record how long work waited in `queue` for a worker. Call it from the
+    worker inside the submitter's copied context so the wait lands in the
+    same per-document breakdown.
+    """
+    QUEUE_WAIT_SECONDS.observe(waited, queue=queue)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown[f"queue.{queue}"] = round(breakdown.get(f"queue.{queue}", 0.0) + waited, 6)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
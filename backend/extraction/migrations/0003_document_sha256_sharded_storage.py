@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:41
+
+import extraction.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0002_document_user_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=extraction.storage.select_document_storage, upload_to=extraction.storage.sharded_upload_to),
+        ),
+    ]
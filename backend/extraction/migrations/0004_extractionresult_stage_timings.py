@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0003_document_sha256_sharded_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionresult',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0004_extractionresult_stage_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionresult',
+            name='text_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='CachedAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('question_hash', models.CharField(max_length=64)),
+                ('question', models.TextField()),
+                ('model_version', models.CharField(max_length=255)),
+                ('answer', models.JSONField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'question_hash', 'model_version'), name='unique_cached_answer')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0005_cachedanswer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionresult',
+            name='classification',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='document_type',
+            field=models.CharField(choices=[('invoice', 'Invoice'), ('resume', 'Resume'), ('research_paper', 'Research Paper'), ('other', 'Other'), ('auto', 'Detect automatically')], max_length=20),
+        ),
+    ]
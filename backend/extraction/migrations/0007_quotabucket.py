@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0006_extractionresult_classification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tokens', models.FloatField()),
+                ('refilled_at', models.FloatField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='quota_bucket', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
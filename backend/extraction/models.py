@@ -1,6 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 import json
+import uuid
+
+from .storage import content_sha256, select_document_storage, sharded_upload_to
 
 
 class Document(models.Model):
@@ -13,7 +17,8 @@ class Document(models.Model):
     ]
     
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='documents/')
+    file = models.FileField(upload_to=sharded_upload_to, storage=select_document_storage)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
     document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPES)
     custom_prompt = models.TextField(blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -22,15 +27,90 @@ class Document(models.Model):
     def __str__(self):
         return f"{self.title} ({self.document_type})"
 
+    def save(self, *args, **kwargs):
+        # The content hash names the stored file, so it must exist before upload.
+        if self.file and not self.file._committed and not self.sha256:
+            self.sha256 = content_sha256(self.file)
+        super().save(*args, **kwargs)
+
 
 class ExtractionResult(models.Model):
     document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='result')
     extracted_data = models.JSONField()
     processing_time = models.FloatField()
+    stage_timings = models.JSONField(default=dict, blank=True)
+    # Document type suggested by the first-page classifier, with its scores
+    classification = models.JSONField(default=dict, blank=True)
+    text_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Result for {self.document.title}"
     
     def get_extracted_data(self):
-        return json.loads(self.extracted_data) if isinstance(self.extracted_data, str) else self.extracted_data
\ No newline at end of file
+        return json.loads(self.extracted_data) if isinstance(self.extracted_data, str) else self.extracted_data
+
+
+class UploadSession(models.Model):
+    """A resumable, chunked upload that is staged on disk until finalized."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, blank=True)
+    # 'auto' is resolved by the classifier when the upload is finalized
+    document_type = models.CharField(
+        max_length=20, choices=Document.DOCUMENT_TYPES + [('auto', 'Detect automatically')]
+    )
+    custom_prompt = models.TextField(blank=True, null=True)
+    total_size = models.BigIntegerField()
+    received_size = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    completed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received_size}/{self.total_size} bytes)"
+
+
+
+class CachedAnswer(models.Model):
+    """
+    A QA answer keyed by the document's extracted text, the normalized
+    question and the QA model version, so changing either the text or the
+    model simply misses. Least recently used rows are evicted past
+    ANSWER_CACHE_MAX_ENTRIES.
+    """
+    content_hash = models.CharField(max_length=64)
+    question_hash = models.CharField(max_length=64)
+    question = models.TextField()
+    model_version = models.CharField(max_length=255)
+    answer = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_hash', 'question_hash', 'model_version'], name='unique_cached_answer'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.question[:50]} ({self.content_hash[:12]})"
+
+
+class QuotaBucket(models.Model):
+    """
+    A user's token bucket for cost-aware quotas (see throttling.py). Kept in
+    the database so every worker draws from the same bucket; it is only
+    changed by single conditional UPDATEs.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='quota_bucket')
+    tokens = models.FloatField()
+    # Unix time `tokens` was last brought up to date
+    refilled_at = models.FloatField()
+
+    def __str__(self):
+        return f"Quota for user {self.user_id} ({self.tokens:.1f} units)"
@@ -0,0 +1,180 @@
+import io
+import logging
+import mmap
+import os
+from contextlib import contextmanager
+
+from .metrics import stage
+
+logger = logging.getLogger(__name__)
+
+
+def open_pdf(source):
+    """
+    Open a PDF from a path, bytes-like buffer (bytes, bytearray, memoryview,
+    mmap) or readable file object, without writing a temporary file.
+    """
+    # Imported on first use so booting Django does not load PyMuPDF.
+    import fitz  # PyMuPDF
+
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    if isinstance(source, mmap.mmap):
+        source = memoryview(source)
+    elif hasattr(source, 'read'):
+        source.seek(0)
+        source = source.read()
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def extract_text(source) -> str:
+    doc = open_pdf(source)
+    try:
+        return "".join(page.get_text() for page in doc)
+    finally:
+        doc.close()
+
+
+def first_page_text(source) -> str:
+    doc = open_pdf(source)
+    try:
+        return doc[0].get_text() if doc.page_count else ""
+    finally:
+        doc.close()
+
+
+class DocumentPages:
+    """
+    Page texts of a PDF, parsed one page at a time on first access and kept.
+    Extractors that only need the first page never pay for the rest. The
+    source must stay open until close(). A PDF that cannot be opened reads
+    as having no pages, and an unreadable page as empty text.
+    """
+
+    def __init__(self, source=None, texts=None):
+        self._source = source
+        self._doc = None
+        self._opened = texts is not None
+        self._count = len(texts) if texts is not None else 0
+        self._texts = dict(enumerate(texts or ()))
+
+    @classmethod
+    def of(cls, text):
+        """`text` itself if already DocumentPages, else a single page holding it."""
+        return text if isinstance(text, cls) else cls(texts=[text])
+
+    def _open(self):
+        if not self._opened:
+            self._opened = True
+            try:
+                self._doc = open_pdf(self._source)
+                self._count = self._doc.page_count
+            except Exception as e:
+                logger.error(f"Error opening PDF: {e}")
+        return self._doc
+
+    def __len__(self):
+        self._open()
+        return self._count
+
+    def page(self, index) -> str:
+        if index not in self._texts:
+            try:
+                with stage('extract_text'):
+                    self._texts[index] = self._open()[index].get_text()
+            except Exception as e:
+                logger.error(f"Error extracting text from PDF page {index + 1}: {e}")
+                self._texts[index] = ""
+        return self._texts[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.page(index)
+
+    @property
+    def header(self) -> str:
+        """Text of the first page."""
+        return self.page(0) if len(self) else ""
+
+    @property
+    def text(self) -> str:
+        """The whole document's text, the same as extract_text() returns."""
+        return "".join(self)
+
+    def prefix(self, length) -> str:
+        """The first `length` characters, parsing only the pages they span."""
+        text = ""
+        for page in self:
+            text += page
+            if len(text) >= length:
+                break
+        return text[:length]
+
+    def prefixes(self):
+        """Text of the first page, the first two pages, ..., one more page parsed each step."""
+        text = ""
+        for page in self:
+            text += page
+            yield text
+
+    def suffixes(self):
+        """Text of the last page, the last two pages, ..., parsing backwards."""
+        text = ""
+        for index in reversed(range(len(self))):
+            text = self.page(index) + text
+            yield text
+
+    def is_blank(self) -> bool:
+        """True if no page has any text; stops at the first page that does."""
+        return not any(page.strip() for page in self)
+
+    @property
+    def pages_parsed(self) -> int:
+        return len(self._texts)
+
+    @property
+    def complete(self) -> bool:
+        return len(self._texts) == len(self)
+
+    def close(self):
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def upload_buffer(upload):
+    """
+    Yield the bytes of an uploaded file without copying them: the in-memory
+    buffer for small uploads, a memory map for uploads spooled to disk.
+    """
+    file = getattr(upload, 'file', upload)
+    if isinstance(file, io.BytesIO):
+        view = file.getbuffer()
+        try:
+            yield view
+        finally:
+            view.release()
+        return
+    try:
+        fileno = file.fileno()
+        size = os.fstat(fileno).st_size
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        upload.seek(0)
+        yield upload.read()
+        return
+    if size == 0:
+        yield b''
+        return
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
@@ -0,0 +1,207 @@
+import asyncio
+import time
+import logging
+from concurrent import futures
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import status
+
+from .answer_cache import schedule_prefill, text_sha256
+from .classifier import AUTO_DOCUMENT_TYPE, classify_pdf
+from .executors import get_executor
+from .models import Document, ExtractionResult
+from .inference_client import get_processor
+from .metrics import DOCUMENTS_PROCESSED, PDF_PAGES, collect_stages, stage
+from .pdf import DocumentPages, upload_buffer
+from .schemas import load_extraction
+from .storage import open_document_buffer
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def process_text(document_type, text, custom_prompt=None):
+    """Run the processor for `document_type`, returning its typed schema model."""
+    if document_type == 'invoice':
+        data = get_processor().process_invoice(text)
+    elif document_type == 'resume':
+        data = get_processor().process_resume(text)
+    elif document_type == 'research_paper':
+        data = get_processor().process_research_paper(text)
+    elif document_type == 'other':
+        data = get_processor().process_custom(text, custom_prompt or '')
+    else:
+        raise ExtractionError('Invalid document type')
+    return load_extraction(document_type, data)
+
+
+def classify_upload(pages, document_type):
+    """
+    Run the first-page classifier unless the type is 'other'. Returns the
+    document type to process ('auto' becomes the predicted type) and the
+    classification to store with the result. 'auto' is refused below
+    settings.CLASSIFIER_MIN_CONFIDENCE: the classifier only knows the
+    supported types, so a contract or letter still gets a best guess.
+    """
+    if document_type == 'other':
+        return document_type, {}
+    classification = classify_pdf(pages)
+    if classification is None:
+        if document_type == AUTO_DOCUMENT_TYPE:
+            raise ExtractionError('Could not detect the document type, please choose one')
+        return document_type, {}
+    confident = classification['confidence'] >= settings.CLASSIFIER_MIN_CONFIDENCE
+    if document_type == AUTO_DOCUMENT_TYPE:
+        if not confident:
+            raise ExtractionError('Could not detect the document type, please choose one')
+        return classification['document_type'], dict(classification, auto=True, confident=True)
+    # 'confident' tells clients whether a disagreeing prediction is worth showing.
+    return document_type, dict(classification, confident=confident)
+
+
+def extract_pages(document_type, pages, custom_prompt=None):
+    """
+    Process a document's DocumentPages. Each field reads only the pages its
+    document type declares (ai_processor.FIELD_SCOPES), so a typical
+    document is never parsed in full.
+    """
+    if pages.is_blank():
+        raise ExtractionError('Could not extract text from PDF')
+    with stage(f"process.{document_type}"):
+        return process_text(document_type, pages, custom_prompt)
+
+
+def _result_fields(document_type, pages, extracted_data, start_time, stage_timings, classification):
+    """ExtractionResult fields for a finished extraction; call before the pages close."""
+    PDF_PAGES.inc(pages.pages_parsed, document_type=document_type, parsed='true')
+    PDF_PAGES.inc(len(pages) - pages.pages_parsed, document_type=document_type, parsed='false')
+    return {
+        'extracted_data': extracted_data.model_dump(mode='json'),
+        'processing_time': time.time() - start_time,
+        'stage_timings': dict(stage_timings),
+        'classification': classification or {},
+        # Left blank unless every page was parsed; the answer cache fills it
+        # in the first time it reads the whole text.
+        'text_sha256': text_sha256(pages.text) if pages.complete else '',
+    }
+
+
+def _save_result(document, fields):
+    # Replacing an existing result fires the signals that drop its cached
+    # answers and responses.
+    result, _ = ExtractionResult.objects.update_or_create(document=document, defaults=fields)
+    document.processed = True
+    document.save()
+    transaction.on_commit(lambda: schedule_prefill(document))
+    DOCUMENTS_PROCESSED.inc(document_type=document.document_type, status='success')
+    return result
+
+
+def run_extraction(document, start_time=None, classification=None):
+    """
+    Extract a stored document as its current document_type and save (or
+    replace) its ExtractionResult together with the per-stage timing
+    breakdown. Pages are parsed from the memory-mapped file as they are
+    needed, on the shared 'inference' executor, which queues fairly per user
+    and may raise ExecutorBusy. Used to re-extract documents.
+    """
+    if start_time is None:
+        start_time = time.time()
+
+    with collect_stages() as stage_timings:
+        with open_document_buffer(document) as buffer, DocumentPages(buffer) as pages:
+            try:
+                extracted_data = get_executor('inference').call_for(
+                    document.user_id, extract_pages, document.document_type, pages, document.custom_prompt
+                )
+            except Exception:
+                DOCUMENTS_PROCESSED.inc(document_type=document.document_type, status='error')
+                raise
+            fields = _result_fields(
+                document.document_type, pages, extracted_data, start_time, stage_timings, classification
+            )
+        if not fields['text_sha256']:
+            # The stored file, and so its text, has not changed: keep the hash
+            # a previous full read recorded, and the answers cached under it.
+            del fields['text_sha256']
+        return _save_result(document, fields)
+
+
+def extract_upload(upload, **document_fields):
+    """
+    Create a Document from an uploaded file and extract it. Pages are parsed
+    straight from the received buffer, only as far as the document type
+    needs, while the file is written to storage.
+    """
+    start_time = time.time()
+    owner = document_fields['user'].pk
+    with collect_stages() as stage_timings:
+        with upload_buffer(upload) as buffer, DocumentPages(buffer) as pages:
+            document_type, classification = get_executor('pdf_parse').call_for(
+                owner, classify_upload, pages, document_fields['document_type']
+            )
+            document_fields['document_type'] = document_type
+            extraction = get_executor('inference').submit_for(
+                owner, extract_pages, document_type, pages, document_fields.get('custom_prompt')
+            )
+            try:
+                with stage('persist'):
+                    document = Document.objects.create(file=upload, **document_fields)
+            finally:
+                # The pages must stay open until extraction is done, even if persisting failed.
+                futures.wait([extraction])
+            try:
+                extracted_data = extraction.result()
+            except Exception:
+                DOCUMENTS_PROCESSED.inc(document_type=document_type, status='error')
+                raise
+            fields = _result_fields(document_type, pages, extracted_data, start_time, stage_timings, classification)
+        return document, _save_result(document, fields)
+
+
+async def aextract_upload(upload, **document_fields):
+    """
+    Async counterpart of extract_upload for ASGI views. Classification and
+    extraction run on the bounded 'pdf_parse' and 'inference' executors
+    (which may raise ExecutorBusy); database writes use the async ORM.
+    """
+    start_time = time.time()
+    owner = document_fields['user'].pk
+    with collect_stages() as stage_timings:
+        async def persist():
+            with stage('persist'):
+                return await Document.objects.acreate(file=upload, **document_fields)
+
+        with upload_buffer(upload) as buffer, DocumentPages(buffer) as pages:
+            document_type, classification = await get_executor('pdf_parse').run_for(
+                owner, classify_upload, pages, document_fields['document_type']
+            )
+            document_fields['document_type'] = document_type
+            # Submitted before persisting so a full executor rejects the upload cleanly.
+            extraction = asyncio.wrap_future(get_executor('inference').submit_for(
+                owner, extract_pages, document_type, pages, document_fields.get('custom_prompt')
+            ))
+            # Both must finish before the pages close, even if one failed.
+            extracted_data, document = await asyncio.gather(extraction, persist(), return_exceptions=True)
+            if isinstance(extracted_data, BaseException):
+                DOCUMENTS_PROCESSED.inc(document_type=document_type, status='error')
+                raise extracted_data
+            if isinstance(document, BaseException):
+                raise document
+            fields = _result_fields(document_type, pages, extracted_data, start_time, stage_timings, classification)
+
+        result = await ExtractionResult.objects.acreate(document=document, **fields)
+
+    document.processed = True
+    await document.asave()
+    # Autocommit: the rows are already visible to the prefill thread.
+    schedule_prefill(document)
+    DOCUMENTS_PROCESSED.inc(document_type=document_type, status='success')
+    return document, result
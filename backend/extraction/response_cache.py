@@ -0,0 +1,120 @@
+"""
+Cached document list and detail payloads.
+
+Payloads live in the Django cache under keys that embed a version stamp.
+Uploads and re-extractions bump the stamp (see signals.py), so stale entries
+are never read again and simply expire. A hash of the payload is its ETag,
+and the stamp's second its Last-Modified time. Two changes in one second
+share a Last-Modified, so it is only sent, and If-Modified-Since only
+honoured, once that second is over; within it clients validate on the ETag.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .metrics import record_cache_lookup
+
+
+def _version_key(scope, ident):
+    return f"extraction:version:{scope}:{ident}"
+
+
+def get_version(scope, ident):
+    """Version stamp (time of the last change) for a user's list or one document."""
+    key = _version_key(scope, ident)
+    version = cache.get(key)
+    if version is None:
+        version = time.time()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def aget_version(scope, ident):
+    key = _version_key(scope, ident)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time()
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def bump_version(scope, ident):
+    cache.set(_version_key(scope, ident), time.time(), None)
+
+
+def invalidate_document(document_id, user_id):
+    bump_version('documents', user_id)
+    bump_version('document', document_id)
+
+
+def cached_payload(name, scope, ident, build, user_id):
+    """
+    Return (data, etag, last_modified) for a payload, calling `build` and
+    caching its result on a miss. Entries are scoped to `user_id`.
+    """
+    version = get_version(scope, ident)
+    key = f"extraction:{name}:{user_id}:{ident}:{version}"
+    entry = cache.get(key)
+    record_cache_lookup(name, entry is not None)
+    if entry is None:
+        entry = _make_entry(build())
+        cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+    return entry['data'], entry['etag'], int(version)
+
+
+async def acached_payload(name, scope, ident, build, user_id):
+    """cached_payload for async views; `build` is a coroutine function."""
+    version = await aget_version(scope, ident)
+    key = f"extraction:{name}:{user_id}:{ident}:{version}"
+    entry = await cache.aget(key)
+    record_cache_lookup(name, entry is not None)
+    if entry is None:
+        entry = _make_entry(await build())
+        await cache.aset(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+    return entry['data'], entry['etag'], int(version)
+
+
+def _make_entry(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return {'data': data, 'etag': '"%s"' % hashlib.sha1(body.encode()).hexdigest()}
+
+
+def _settled(last_modified):
+    """Whether no later change can share this Last-Modified second any more."""
+    return int(time.time()) > last_modified
+
+
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if _settled(last_modified):
+        response['Last-Modified'] = http_date(last_modified)
+    # Clients must revalidate, and cached copies are per user.
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    """
+    A 304 response if the client's copy is current, else None. If-None-Match
+    takes precedence over If-Modified-Since (RFC 9110).
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified if _settled(last_modified) else None
+    )
+    if isinstance(response, HttpResponseNotModified):
+        return _set_validators(response, etag, last_modified)
+    return None
+
+
+def with_validators(response, etag, last_modified):
+    return _set_validators(response, etag, last_modified)
@@ -1,9 +1,84 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
+import re
 
 
-class InvoiceData(BaseModel):
+# NER entity compacted to (label, start, end, score)
+Entity = Tuple[str, Optional[int], Optional[int], float]
+
+DATE_FORMATS = (
+    '%Y-%m-%d', '%Y/%m/%d',
+    '%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y', '%m-%d-%y',
+    '%d/%m/%Y', '%d-%m-%Y',
+    '%b %d, %Y', '%b %d %Y', '%B %d, %Y', '%B %d %Y',
+)
+
+
+def normalize_date(value):
+    """
+    ISO 8601 date for the formats we extract. Dates that read differently
+    month-first and day-first (03/04/2024) are kept as written, as is
+    anything we can't parse.
+    """
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    parsed = set()
+    for fmt in DATE_FORMATS:
+        try:
+            parsed.add(datetime.strptime(value, fmt).date().isoformat())
+        except ValueError:
+            continue
+    if len(parsed) == 1:
+        return parsed.pop()
+    return value or None
+
+
+def normalize_amount(value):
+    """
+    Amounts as floats rounded to cents. Strings like '$1,250.00' and
+    '1.250,00 EUR' are parsed: the last '.' or ',' is the decimal separator,
+    unless it is the only separator and has exactly three digits after it
+    ('1,250'), or appears more than once ('1.250.000').
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = re.sub(r'[^\d.,\-]', '', value)
+        separators = [c for c in value if c in '.,']
+        if separators:
+            last = separators[-1]
+            integer, _, fraction = value.rpartition(last)
+            if len(set(separators)) == 1 and (len(separators) > 1 or len(fraction) == 3):
+                value = value.replace(last, '')
+            else:
+                value = re.sub(r'[.,]', '', integer) + '.' + fraction
+        if not re.search(r'\d', value):
+            return None
+    return round(float(value), 2)
+
+
+def compact_entity(entity):
+    if isinstance(entity, dict):
+        start, end = entity.get('start'), entity.get('end')
+        return (
+            entity.get('entity_group') or entity.get('entity'),
+            None if start is None else int(start),
+            None if end is None else int(end),
+            round(float(entity.get('score', 0.0)), 4)
+        )
+    return entity
+
+
+class ExtractedData(BaseModel):
+    @field_validator('entities', mode='before', check_fields=False)
+    @classmethod
+    def compact_entities(cls, value):
+        return [compact_entity(entity) for entity in value or []]
+
+
+class InvoiceData(ExtractedData):
     invoice_number: Optional[str] = None
     date: Optional[str] = None
     due_date: Optional[str] = None
@@ -15,9 +90,20 @@ class InvoiceData(BaseModel):
     tax_amount: Optional[float] = None
     subtotal: Optional[float] = None
     line_items: Optional[List[Dict[str, Any]]] = []
+    entities: List[Entity] = []
+
+    @field_validator('date', 'due_date', mode='before')
+    @classmethod
+    def normalize_dates(cls, value):
+        return normalize_date(value)
 
+    @field_validator('total_amount', 'tax_amount', 'subtotal', mode='before')
+    @classmethod
+    def normalize_amounts(cls, value):
+        return normalize_amount(value)
 
-class ResumeData(BaseModel):
+
+class ResumeData(ExtractedData):
     name: Optional[str] = None
     email: Optional[str] = None
     phone: Optional[str] = None
@@ -27,9 +113,10 @@ class ResumeData(BaseModel):
     experience: Optional[List[Dict[str, Any]]] = []
     skills: Optional[List[str]] = []
     certifications: Optional[List[str]] = []
+    entities: List[Entity] = []
 
 
-class ResearchPaperData(BaseModel):
+class ResearchPaperData(ExtractedData):
     title: Optional[str] = None
     authors: Optional[List[str]] = []
     abstract: Optional[str] = None
@@ -39,15 +126,52 @@ class ResearchPaperData(BaseModel):
     doi: Optional[str] = None
     sections: Optional[List[Dict[str, str]]] = []
     references: Optional[List[str]] = []
+    summary: Optional[str] = None
+
+    @field_validator('publication_date', mode='before')
+    @classmethod
+    def normalize_dates(cls, value):
+        return normalize_date(value)
 
 
-class CustomExtractionData(BaseModel):
+class CustomExtractionData(ExtractedData):
     extracted_fields: Dict[str, Any] = Field(default_factory=dict)
     prompt_used: Optional[str] = None
+    model: Optional[str] = None
+    result: Optional[str] = None
+
+
+class ExtractionFailure(BaseModel):
+    error: str
+
+
+class QAAnswer(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    score: Optional[float] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
+EXTRACTION_SCHEMAS = {
+    'invoice': InvoiceData,
+    'resume': ResumeData,
+    'research_paper': ResearchPaperData,
+    'other': CustomExtractionData,
+}
+
+
+def load_extraction(document_type, data):
+    """Rebuild the typed model from serialized extraction output."""
+    if isinstance(data, BaseModel):
+        return data
+    if isinstance(data, dict) and 'error' in data:
+        return ExtractionFailure.model_validate(data)
+    return EXTRACTION_SCHEMAS[document_type].model_validate(data)
 
 
 class DocumentUploadRequest(BaseModel):
-    document_type: str = Field(..., regex="^(invoice|resume|research_paper|other)$")
+    document_type: str = Field(..., pattern="^(invoice|resume|research_paper|other)$")
     custom_prompt: Optional[str] = None
 
 
@@ -57,4 +181,4 @@ class ExtractionResponse(BaseModel):
     document_type: str
     extracted_data: Dict[str, Any]
     processing_time: float
-    message: Optional[str] = None
\ No newline at end of file
+    message: Optional[str] = None
@@ -21,6 +21,17 @@ class ExtractionResultSerializer(serializers.ModelSerializer):
 
 class DocumentUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
-    document_type = serializers.ChoiceField(choices=['invoice', 'resume', 'research_paper', 'other'])
+    document_type = serializers.ChoiceField(choices=['invoice', 'resume', 'research_paper', 'other', 'auto'])
+    custom_prompt = serializers.CharField(required=False, allow_blank=True)
+    title = serializers.CharField(max_length=255, required=False)
+
+class ReextractSerializer(serializers.Serializer):
+    document_type = serializers.ChoiceField(choices=['invoice', 'resume', 'research_paper', 'other'], required=False)
+    custom_prompt = serializers.CharField(required=False, allow_blank=True)
+
+class UploadInitSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    total_size = serializers.IntegerField(min_value=1)
+    document_type = serializers.ChoiceField(choices=['invoice', 'resume', 'research_paper', 'other', 'auto'])
     custom_prompt = serializers.CharField(required=False, allow_blank=True)
     title = serializers.CharField(max_length=255, required=False)
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .answer_cache import invalidate
+from .models import Document, ExtractionResult
+from .response_cache import invalidate_document
+
+
+@receiver(pre_save, sender=ExtractionResult)
+def remember_previous_text_hash(sender, instance, **kwargs):
+    instance._previous_text_sha256 = None
+    if instance.pk:
+        instance._previous_text_sha256 = (
+            ExtractionResult.objects.filter(pk=instance.pk).values_list('text_sha256', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=ExtractionResult)
+def invalidate_answers_on_reextraction(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_text_sha256', None)
+    if previous and previous != instance.text_sha256:
+        invalidate(previous)
+
+
+@receiver(post_delete, sender=ExtractionResult)
+def invalidate_answers_on_delete(sender, instance, **kwargs):
+    invalidate(instance.text_sha256)
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def invalidate_cached_document(sender, instance, **kwargs):
+    invalidate_document(instance.pk, instance.user_id)
+
+
+@receiver(post_save, sender=ExtractionResult)
+@receiver(post_delete, sender=ExtractionResult)
+def invalidate_cached_result(sender, instance, **kwargs):
+    invalidate_document(instance.document_id, instance.document.user_id)
@@ -0,0 +1,189 @@
+import hashlib
+import io
+import logging
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, Storage, storages
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+def select_document_storage():
+    """Storage for uploaded documents, configured as STORAGES['documents']."""
+    return storages['documents']
+
+
+def content_sha256(file) -> str:
+    hasher = hashlib.sha256()
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    for chunk in file.chunks(HASH_BLOCK_SIZE):
+        hasher.update(chunk)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return hasher.hexdigest()
+
+
+def sharded_upload_to(instance, filename):
+    """
+    Content-addressed path: documents/ab/cd/abcd...ef.pdf
+
+    Two levels of 256-way sharding keep every directory small, and identical
+    uploads map to the same object so they are stored once.
+    """
+    digest = instance.sha256
+    ext = os.path.splitext(filename)[1].lower() or '.pdf'
+    return f"documents/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+class ContentAddressedMixin:
+    """Names are derived from content, so an existing name already holds the same bytes."""
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+
+@deconstructible(path='extraction.storage.ShardedFileSystemStorage')
+class ShardedFileSystemStorage(ContentAddressedMixin, FileSystemStorage):
+    def _save(self, name, content):
+        """
+        Write to a temporary file beside the target and hard-link it into
+        place. Readers never see a partial object, and when a concurrent
+        upload of the same bytes links first, FileExistsError just means the
+        object is already stored. (FileSystemStorage._save would retry the
+        same name forever.)
+        """
+        if self.exists(name):
+            return name
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                os.close(fd)
+                file_move_safe(content.temporary_file_path(), temp_path, allow_overwrite=True)
+            else:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in content.chunks():
+                        f.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+            try:
+                os.link(temp_path, full_path)
+            except FileExistsError:
+                pass
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+    @contextmanager
+    def open_buffer(self, name):
+        """Memory-map the stored file instead of reading it into memory."""
+        with open(self.path(name), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b'')
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+
+@deconstructible(path='extraction.storage.S3CompatibleStorage')
+class S3CompatibleStorage(ContentAddressedMixin, Storage):
+    """
+    Minimal storage for S3 or any S3-compatible service (MinIO, Ceph, R2).
+    Requires boto3, which is only imported when this backend is configured.
+    """
+
+    def __init__(self, bucket_name=None, endpoint_url=None, access_key=None,
+                 secret_key=None, region_name=None, location=''):
+        try:
+            import boto3
+        except ImportError:
+            raise ImproperlyConfigured("S3CompatibleStorage requires boto3 (pip install boto3)")
+        if not bucket_name:
+            raise ImproperlyConfigured("S3CompatibleStorage requires a bucket_name")
+        self.bucket_name = bucket_name
+        self.location = location.strip('/')
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region_name
+        )
+
+    def _key(self, name):
+        name = name.replace('\\', '/').lstrip('/')
+        return f"{self.location}/{name}" if self.location else name
+
+    def _not_found(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def _open(self, name, mode='rb'):
+        obj = self.client.get_object(Bucket=self.bucket_name, Key=self._key(name))
+        return ContentFile(obj['Body'].read(), name=name)
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        self.client.upload_fileobj(content, self.bucket_name, self._key(name))
+        return name
+
+    def exists(self, name):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket_name, Key=self._key(name))
+            return True
+        except ClientError as e:
+            if self._not_found(e):
+                return False
+            raise
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket_name, Key=self._key(name))
+
+    def size(self, name):
+        return self.client.head_object(Bucket=self.bucket_name, Key=self._key(name))['ContentLength']
+
+    def url(self, name):
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket_name, 'Key': self._key(name)}
+        )
+
+    @contextmanager
+    def open_buffer(self, name):
+        buffer = io.BytesIO()
+        self.client.download_fileobj(self.bucket_name, self._key(name), buffer)
+        yield buffer.getbuffer()
+
+
+@contextmanager
+def open_document_buffer(document):
+    """
+    Yield the stored PDF as a buffer: memory-mapped on local disk, fetched
+    once from object storage. Works without `document.file.path`, so
+    extraction can run on a different machine than the web node.
+    """
+    storage = document.file.storage
+    if hasattr(storage, 'open_buffer'):
+        with storage.open_buffer(document.file.name) as buffer:
+            yield buffer
+        return
+    with storage.open(document.file.name, 'rb') as f:
+        yield f.read()
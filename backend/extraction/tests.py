@@ -1,3 +1,819 @@
-from django.test import TestCase
+import hashlib
+import importlib.util
+import io
+import random
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import warnings
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import benchmark
+from .ai_processor import DocumentProcessor, set_processor
+from .batching import BatchedPipeline, MicroBatcher, disable_batching, enable_batching
+from .executors import BoundedExecutor, ExecutorBusy
+from .inference_client import InferenceUnavailable, RemoteProcessor
+from .inference_server import InferenceServer
+from .models import Document, QuotaBucket, UploadSession
+from .pdf import DocumentPages, extract_text
+from .response_cache import get_version, not_modified, with_validators
+from .schemas import normalize_amount, normalize_date
+from .storage import ShardedFileSystemStorage
+from .uploads import UploadError, append_chunk, purge_stale_uploads
+
+# Modules that only model inference (or PDF parsing) may load.
+HEAVY_MODULES = ('torch', 'transformers', 'llama_cpp', 'fitz', 'pymupdf', 'PIL', 'numpy')
+
+
+class ImportBudgetTests(SimpleTestCase):
+    """Each check runs in a fresh interpreter; in this one other tests have already loaded everything."""
+
+    def heavy_modules_loaded_by(self, code):
+        script = textwrap.dedent(f"""
+            import os, sys
+            os.environ['DJANGO_SETTINGS_MODULE'] = {settings.SETTINGS_MODULE!r}
+            import django
+            django.setup()
+        """) + textwrap.dedent(code) + textwrap.dedent(f"""
+            print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+        """)
+        result = subprocess.run(
+            [sys.executable, '-c', script],
+            cwd=Path(settings.BASE_DIR),
+            capture_output=True,
+            text=True,
+            timeout=120
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+
+    def test_booting_django_does_not_load_ml_stack(self):
+        """Settings, app registry and URLconf must import without the ML stack."""
+        loaded = self.heavy_modules_loaded_by("""
+            import document_extractor.urls
+            import extraction.ai_processor
+        """)
+        self.assertEqual(loaded, '', f"Heavy modules loaded at boot: {loaded}")
+
+    def test_auth_endpoints_do_not_load_ml_stack(self):
+        loaded = self.heavy_modules_loaded_by("""
+            from django.db import connection
+            from django.test.utils import setup_test_environment
+            from rest_framework.test import APIClient
+
+            setup_test_environment()
+            connection.creation.create_test_db(verbosity=0)
+            client = APIClient()
+            response = client.post('/api/register/', {'email': 'budget@example.com', 'password': 'budget-pass-123'}, format='json')
+            assert response.status_code == 201, response.content
+            response = client.post('/api/token/', {'username': 'budget@example.com', 'password': 'budget-pass-123'}, format='json')
+            assert response.status_code == 200, response.content
+        """)
+        self.assertEqual(loaded, '', f"Auth endpoints loaded: {loaded}")
+
+
+class StubModelsMixin:
+    """Run against a temporary media root and cache with stand-in models."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=media_root,
+            UPLOAD_STAGING_DIR=Path(media_root) / 'uploads',
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': str(Path(media_root) / 'cache'),
+            }},
+            ANSWER_CACHE_PREFILL_QUESTIONS={}
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        set_processor(DocumentProcessor(models=benchmark.stub_models()))
+        self.addCleanup(set_processor, None)
+        self.user = User.objects.create_user('tester@example.com', password='test-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def extract(self, document_type='invoice', pages=1, seed=0):
+        pdf = ContentFile(benchmark.generate_pdf(document_type, pages, seed=seed), name=f'{document_type}.pdf')
+        response = self.client.post('/api/extract/', {'file': pdf, 'document_type': document_type}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+
+class ChunkedUploadTests(StubModelsMixin, TestCase):
+    def init(self, size, filename='invoice.pdf', document_type='invoice'):
+        return self.client.post('/api/uploads/', {
+            'filename': filename, 'total_size': size, 'document_type': document_type
+        }, format='json')
+
+    def put(self, upload_id, chunk, offset):
+        return self.client.put(
+            f'/api/uploads/{upload_id}/', chunk,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_resume_and_finalize(self):
+        pdf = benchmark.generate_pdf('invoice', 1)
+        upload_id = self.init(len(pdf)).json()['upload_id']
+        half = len(pdf) // 2
+        self.assertEqual(self.put(upload_id, pdf[:half], 0).status_code, 200)
+
+        # An interrupted client asks where to resume from.
+        response = self.client.get(f'/api/uploads/{upload_id}/')
+        self.assertEqual(response.json()['received_size'], half)
+        response = self.put(upload_id, pdf[half:], half)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['received_size'], len(pdf))
+
+        response = self.client.post(f'/api/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()['extracted_data']['invoice_number'].startswith('INV-'))
+        self.assertEqual(Document.objects.get(user=self.user).sha256, hashlib.sha256(pdf).hexdigest())
+        self.assertFalse(UploadSession.objects.filter(id=upload_id).exists())
+
+    def test_offset_mismatch_is_409(self):
+        pdf = benchmark.generate_pdf('invoice', 1)
+        upload_id = self.init(len(pdf)).json()['upload_id']
+        self.assertEqual(self.put(upload_id, pdf[:100], 0).status_code, 200)
+        self.assertEqual(self.put(upload_id, pdf[100:200], 0).status_code, 409)
+        self.assertEqual(self.put(upload_id, pdf[100:200], 150).status_code, 409)
+
+    def test_stale_session_rechecks_offset_under_lock(self):
+        pdf = benchmark.generate_pdf('invoice', 1)
+        upload_id = self.init(len(pdf)).json()['upload_id']
+        stale = UploadSession.objects.get(id=upload_id)
+        self.assertEqual(self.put(upload_id, pdf[:100], 0).status_code, 200)
+
+        # A second request that loaded the session before the first one wrote.
+        with self.assertRaises(UploadError) as raised:
+            append_chunk(stale, io.BytesIO(pdf[:100]), 0, 100)
+        self.assertEqual(raised.exception.status_code, 409)
+        self.assertEqual((Path(settings.UPLOAD_STAGING_DIR) / f"{upload_id}.part").read_bytes(), pdf[:100])
+
+    def test_oversize_is_413(self):
+        response = self.init(settings.MAX_UPLOAD_SIZE + 1)
+        self.assertEqual(response.status_code, 413)
+
+        upload_id = self.init(10).json()['upload_id']
+        self.assertEqual(self.put(upload_id, b'%PDF-' + b'x' * 10, 0).status_code, 413)
+
+    def test_non_pdf_is_rejected(self):
+        self.assertEqual(self.init(10, filename='notes.txt').status_code, 400)
+
+        upload_id = self.init(10).json()['upload_id']
+        self.assertEqual(self.put(upload_id, b'GIF89a....', 0).status_code, 400)
+
+    def test_magic_bytes_split_across_chunks(self):
+        upload_id = self.init(10).json()['upload_id']
+        self.assertEqual(self.put(upload_id, b'%PD', 0).status_code, 200)
+        self.assertEqual(self.put(upload_id, b'XXXXXXX', 3).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').json()['received_size'], 3)
+
+    def test_stale_sessions_are_purged(self):
+        upload_id = self.init(10).json()['upload_id']
+        self.put(upload_id, b'%PDF-', 0)
+        session = UploadSession.objects.get(id=upload_id)
+        UploadSession.objects.filter(id=upload_id).update(updated_at=session.updated_at - timedelta(days=2))
+        self.assertEqual(purge_stale_uploads(timedelta(days=1)), 1)
+        self.assertFalse((Path(settings.UPLOAD_STAGING_DIR) / f"{upload_id}.part").exists())
+
+
+class AnswerCacheTests(StubModelsMixin, TestCase):
+    def test_single_question_is_cached_with_offsets(self):
+        document_id = self.extract()['document_id']
+        question = 'What is the total?'
+        first = self.client.post(f'/api/documents/{document_id}/ask_question/', {'question': question}, format='json')
+        self.assertEqual(first.status_code, 200, first.content)
+        self.assertIsNotNone(first.json()['result']['start'])
+
+        # Served from the entry ask_question stored, with the same offsets.
+        with mock.patch.object(DocumentProcessor, 'answer_questions', side_effect=AssertionError('cache miss')):
+            response = self.client.post(f'/api/documents/{document_id}/ask_questions/',
+                                        {'questions': [question]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()['results'][0]
+        self.assertEqual((result['start'], result['end']), (first.json()['result']['start'], first.json()['result']['end']))
+        self.assertIsNotNone(result['end'])
+
+
+@skipUnless(importlib.util.find_spec('torch') and importlib.util.find_spec('transformers'), 'needs torch')
+class BatchedQuestionAnsweringTests(SimpleTestCase):
+    """answer_questions must return what the question-answering pipeline returns for each question."""
+
+    WORDS = ['invoice', 'total', 'amount', 'due', 'date', 'vendor', 'acme', 'paid', 'net', 'tax', 'order', 'number']
+
+    def tiny_pipeline(self, layers):
+        import torch
+        from transformers import BertConfig, BertForQuestionAnswering, BertTokenizerFast, pipeline
+
+        vocab = Path(tempfile.mkdtemp()) / 'vocab.txt'
+        self.addCleanup(shutil.rmtree, vocab.parent)
+        vocab.write_text('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', '?', 'what', 'is', 'the',
+                                     'who', 'alpha', 'omega'] + self.WORDS))
+        tokenizer = BertTokenizerFast(str(vocab))
+        torch.manual_seed(0)
+        model = BertForQuestionAnswering(BertConfig(
+            vocab_size=tokenizer.vocab_size, hidden_size=32, num_hidden_layers=layers,
+            num_attention_heads=2, intermediate_size=37
+        )).eval()
+        return pipeline('question-answering', model=model, tokenizer=tokenizer)
+
+    def assertMatchesPipeline(self, qa, text, questions):
+        answers = DocumentProcessor(models={'qa': qa}).answer_questions(text, questions)
+        for question, answer in zip(questions, answers):
+            expected = qa(question=question, context=text)
+            self.assertEqual((answer['answer'], answer['start'], answer['end']),
+                             (expected['answer'], expected['start'], expected['end']))
+            self.assertAlmostEqual(answer['score'], expected['score'], places=6)
+        return answers
+
+    def test_matches_pipeline_over_overlapping_windows(self):
+        rng = random.Random(0)
+        text = ' '.join(rng.choice(self.WORDS) for _ in range(900))
+        self.assertMatchesPipeline(self.tiny_pipeline(layers=2), text,
+                                   ['what is the total?', 'who is the vendor?', 'what is the due date?'])
+
+    def test_answer_across_window_boundary(self):
+        import torch
+
+        qa = self.tiny_pipeline(layers=0)
+        # Start logits pick out 'alpha' and end logits 'omega', wherever they are.
+        with torch.no_grad():
+            embeddings = qa.model.bert.embeddings
+            embeddings.position_embeddings.weight.zero_()
+            embeddings.token_type_embeddings.weight.zero_()
+            for axis, word in enumerate(['alpha', 'omega']):
+                embeddings.word_embeddings.weight[qa.tokenizer.convert_tokens_to_ids(word)] = torch.eye(32)[axis]
+            qa.model.qa_outputs.weight.copy_(3 * torch.eye(32)[:2])
+            qa.model.qa_outputs.bias.zero_()
+
+        question = 'what is the total?'
+        # Context tokens in the first window: [CLS] question [SEP] context [SEP].
+        window = 384 - len(qa.tokenizer(question, add_special_tokens=False)['input_ids']) - 3
+        words = [self.WORDS[i % len(self.WORDS)] for i in range(900)]
+        # The answer starts in the first window and ends in the second.
+        words[window - 3], words[window + 3] = 'alpha', 'omega'
+        [answer] = self.assertMatchesPipeline(qa, ' '.join(words), [question])
+        self.assertEqual(answer['answer'].split()[::6], ['alpha', 'omega'])
+
+
+NDA_TEXT = """MUTUAL NON-DISCLOSURE AGREEMENT
+This Mutual Non-Disclosure Agreement (the "Agreement") is entered into as of January 5, 2024 by and
+between Alpha Corp., a Delaware corporation, and Beta LLC.
+1. Definition of Confidential Information. "Confidential Information" means any information disclosed
+by either party to the other.
+2. Obligations. The Receiving Party shall hold Confidential Information in strict confidence.
+3. Term. This Agreement shall remain in effect for two (2) years."""
+
+
+class AutoClassificationTests(StubModelsMixin, TestCase):
+    def upload(self, pdf):
+        return self.client.post('/api/extract/', {
+            'file': ContentFile(pdf, name='upload.pdf'), 'document_type': 'auto'
+        }, format='multipart')
+
+    def test_confident_prediction_is_processed(self):
+        response = self.upload(benchmark.generate_pdf('invoice', 1))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['document_type'], 'invoice')
+
+    def test_low_confidence_asks_for_a_type(self):
+        response = self.upload(benchmark.pdf_from_pages([NDA_TEXT]))
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn('please choose', response.json()['message'])
+        self.assertFalse(Document.objects.exists())
+
+        with override_settings(CLASSIFIER_MIN_CONFIDENCE=0):
+            self.assertEqual(self.upload(benchmark.pdf_from_pages([NDA_TEXT])).status_code, 200)
+
+    def test_classification_flags(self):
+        response = self.upload(benchmark.generate_pdf('invoice', 1))
+        self.assertTrue(response.json()['classification']['auto'])
+        document_id = response.json()['document_id']
+
+        # A chosen type keeps the prediction, flagged as too weak to suggest.
+        response = self.client.post('/api/extract/', {
+            'file': ContentFile(benchmark.pdf_from_pages([NDA_TEXT]), name='nda.pdf'), 'document_type': 'resume'
+        }, format='multipart')
+        classification = response.json()['classification']
+        self.assertFalse(classification['confident'])
+        self.assertNotIn('auto', classification)
+
+        response = self.client.post(f'/api/documents/{document_id}/reextract/', {'document_type': 'resume'}, format='json')
+        self.assertNotIn('auto', response.json()['classification'])
+
+
+class ResponseCacheTests(StubModelsMixin, TestCase):
+    def test_matching_etag_is_304(self):
+        document_id = self.extract()['document_id']
+        for url in ('/api/documents/', f'/api/documents/{document_id}/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_upload_invalidates_list(self):
+        self.extract(seed=1)
+        response = self.client.get('/api/documents/')
+        etag = response['ETag']
+        self.assertEqual(len(response.json()['documents']), 1)
+
+        self.extract(seed=2)
+        response = self.client.get('/api/documents/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['documents']), 2)
+
+    def test_if_modified_since_waits_for_the_second_to_end(self):
+        request = RequestFactory().get('/', HTTP_IF_MODIFIED_SINCE=http_date(100))
+        # Another change could still land in second 100 and share its Last-Modified.
+        with mock.patch('extraction.response_cache.time.time', return_value=100.9):
+            self.assertIsNone(not_modified(request, '"a"', 100))
+            self.assertNotIn('Last-Modified', with_validators(HttpResponse(), '"a"', 100))
+        with mock.patch('extraction.response_cache.time.time', return_value=101.5):
+            self.assertEqual(not_modified(request, '"a"', 100).status_code, 304)
+            self.assertEqual(with_validators(HttpResponse(), '"a"', 100)['Last-Modified'], http_date(100))
+        # A changed ETag wins over a current If-Modified-Since.
+        request = RequestFactory().get('/', HTTP_IF_MODIFIED_SINCE=http_date(100), HTTP_IF_NONE_MATCH='"old"')
+        with mock.patch('extraction.response_cache.time.time', return_value=101.5):
+            self.assertIsNone(not_modified(request, '"a"', 100))
+
+    def test_invalidation_reaches_other_processes(self):
+        document_id = self.extract()['document_id']
+        version = get_version('documents', self.user.pk)
+        # Another worker, configured by settings.py alone, saves the document.
+        script = textwrap.dedent(f"""
+            import django
+            django.setup()
+            from extraction.response_cache import invalidate_document
+            invalidate_document({document_id}, {self.user.pk})
+        """)
+        result = subprocess.run(
+            [sys.executable, '-c', script],
+            cwd=Path(settings.BASE_DIR),
+            env={**os.environ, 'DJANGO_CACHE_DIR': settings.CACHES['default']['LOCATION']},
+            capture_output=True,
+            text=True,
+            timeout=120
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertGreater(get_version('documents', self.user.pk), version)
+
+
+class ReextractionTests(StubModelsMixin, TestCase):
+    def test_reextract_as_another_type(self):
+        document_id = self.extract('resume')['document_id']
+        url = f'/api/documents/{document_id}/'
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.post(f'{url}reextract/', {'document_type': 'invoice'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn('invoice_number', response.json()['extracted_data'])
+        self.assertEqual(Document.objects.get(id=document_id).document_type, 'invoice')
+
+        # The cached detail payload was invalidated with the old result.
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['document']['document_type'], 'invoice')
+
+    def test_unchanged_text_keeps_cached_answers(self):
+        document_id = self.extract(pages=5)['document_id']
+        url = f'/api/documents/{document_id}/'
+        question = {'question': 'What is the total?'}
+        self.assertEqual(self.client.post(f'{url}ask_question/', question, format='json').status_code, 200)
+        self.assertEqual(self.client.post(f'{url}reextract/', {'document_type': 'invoice'}, format='json').status_code, 200)
+
+        with mock.patch.object(DocumentProcessor, 'answer_questions', side_effect=AssertionError('cache miss')):
+            response = self.client.post(f'{url}ask_question/', question, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_invalid_requests(self):
+        document_id = self.extract()['document_id']
+        response = self.client.post(f'/api/documents/{document_id}/reextract/', {'document_type': 'auto'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/documents/999/reextract/').status_code, 404)
+
+
+class ExportTests(StubModelsMixin, TestCase):
+    def test_date_only_range_covers_whole_day(self):
+        self.extract()
+        today = timezone.localdate().isoformat()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            response = self.client.get('/api/documents/export/ndjson/', {'since': today, 'until': today})
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body.splitlines()), 1)
+
+    def test_invalid_date_is_400(self):
+        response = self.client.get('/api/documents/export/csv/', {'until': '2024-02-30'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(EXTRACTION_QUOTA={'capacity': 6, 'refill_per_second': 0.001})
+class QuotaTests(StubModelsMixin, TestCase):
+    def tokens(self):
+        return QuotaBucket.objects.get(user=self.user).tokens
+
+    def test_exhausted_bucket_is_429(self):
+        self.extract(seed=1)
+        self.extract(seed=2)
+        response = self.client.post('/api/extract/', {
+            'file': ContentFile(benchmark.generate_pdf('invoice', 1, seed=3), name='invoice.pdf'),
+            'document_type': 'invoice'
+        }, format='multipart')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(Document.objects.count(), 2)
+
+    def test_rejected_requests_are_refunded(self):
+        for _ in range(5):
+            response = self.client.post('/api/extract/', {'document_type': 'invoice'}, format='multipart')
+            self.assertEqual(response.status_code, 400)
+        self.assertAlmostEqual(self.tokens(), 6, places=1)
+        self.extract()
+        self.assertAlmostEqual(self.tokens(), 3, places=1)
+
+    def test_busy_finalize_keeps_upload_for_retry(self):
+        pdf = benchmark.generate_pdf('invoice', 1)
+        upload_id = self.client.post('/api/uploads/', {
+            'filename': 'invoice.pdf', 'total_size': len(pdf), 'document_type': 'invoice'
+        }, format='json').json()['upload_id']
+        self.client.put(f'/api/uploads/{upload_id}/', pdf, content_type='application/octet-stream',
+                        HTTP_UPLOAD_OFFSET='0')
+
+        submit_for = BoundedExecutor.submit_for
+
+        def busy_inference(executor, owner, fn, *args, **kwargs):
+            if executor.name == 'inference':
+                raise ExecutorBusy(executor.name, 5)
+            return submit_for(executor, owner, fn, *args, **kwargs)
+
+        with mock.patch.object(BoundedExecutor, 'submit_for', busy_inference):
+            response = self.client.post(f'/api/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertFalse(UploadSession.objects.get(id=upload_id).completed)
+        self.assertAlmostEqual(self.tokens(), 6, places=1)
+
+        response = self.client.post(f'/api/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertAlmostEqual(self.tokens(), 3, places=1)
+
+
+@override_settings(EXTRACTION_QUOTA={'capacity': 6, 'refill_per_second': 0.001})
+class AsyncViewTests(StubModelsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.auth = {'authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def test_requires_valid_token(self):
+        self.assertEqual((await self.async_client.get('/api/async/documents/')).status_code, 401)
+        response = await self.async_client.get('/api/async/documents/', headers={'authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/async/documents/', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_matching_etag_is_304(self):
+        document_id = (await sync_to_async(self.extract)())['document_id']
+        for url in ('/api/async/documents/', f'/api/async/documents/{document_id}/'):
+            response = await self.async_client.get(url, headers=self.auth)
+            self.assertEqual(response.status_code, 200)
+            response = await self.async_client.get(url, headers={**self.auth, 'if-none-match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    async def test_quota_is_charged_after_validation(self):
+        document_id = (await sync_to_async(self.extract)())['document_id']  # 6 - 3 units
+        url = f'/api/async/documents/{document_id}/ask_questions/'
+
+        response = await self.async_client.post(url, {'questions': ['Total?'] * 4}, content_type='application/json',
+                                                headers=self.auth)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Invalid requests are refused as such, even when they would cost more than is left.
+        response = await self.async_client.post(url, {'questions': [''] * 4}, content_type='application/json',
+                                                headers=self.auth)
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.post(url, {'questions': ['Total?', 'Vendor?']}, content_type='application/json',
+                                                headers=self.auth)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertAlmostEqual((await QuotaBucket.objects.aget(user=self.user)).tokens, 1, places=1)
+
+
+class MetricsEndpointTests(StubModelsMixin, TestCase):
+    def test_exposition_from_allowed_address(self):
+        self.extract()
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE', body)
+        self.assertRegex(body, r'extraction_documents_total\{[^}]*document_type="invoice"')
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'], METRICS_TOKEN='scrape-secret')
+    def test_other_clients_need_the_token(self):
+        remote = {'REMOTE_ADDR': '10.0.0.5'}
+        self.assertEqual(self.client.get('/metrics', **remote).status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong', **remote).status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret', **remote).status_code, 200)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer None', **remote).status_code, 403)
+
+
+class BoundedExecutorTests(TestCase):
+    def setUp(self):
+        self.executor = BoundedExecutor('test', max_workers=1, max_queue=8, max_queue_per_user=3)
+        self.addCleanup(self.executor.shutdown)
+        self.started, self.release = threading.Event(), threading.Event()
+        self.addCleanup(self.release.set)
+
+        def block():
+            self.started.set()
+            self.release.wait(5)
+
+        # Occupy the only worker so later tasks queue.
+        self.executor.submit_for('a', block)
+        self.assertTrue(self.started.wait(5))
+
+    def test_owners_are_served_round_robin(self):
+        order = []
+        futures = [self.executor.submit_for('a', order.append, f'a{i}') for i in range(1, 4)]
+        futures.append(self.executor.submit_for('b', order.append, 'b1'))
+        self.release.set()
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(order, ['a1', 'b1', 'a2', 'a3'])
+
+    def test_per_user_queue_is_capped(self):
+        for _ in range(3):
+            self.executor.submit_for('a', time.sleep, 0)
+        with self.assertRaises(ExecutorBusy):
+            self.executor.submit_for('a', time.sleep, 0)
+        # Other users still get in.
+        self.executor.submit_for('b', time.sleep, 0).cancel()
+
+    def test_burst_spawns_workers_past_an_idle_one(self):
+        executor = BoundedExecutor('burst', max_workers=4, max_queue=8)
+        self.addCleanup(executor.shutdown)
+        executor.submit(time.sleep, 0).result(timeout=5)
+        deadline = time.monotonic() + 5
+        while executor._idle != 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        barrier = threading.Barrier(4, timeout=5)
+        # Holding the lock keeps the idle worker asleep for the whole burst.
+        with executor._condition:
+            futures = [executor.submit(barrier.wait) for _ in range(4)]
+        for future in futures:
+            future.result(timeout=10)
+
+
+class NormalizationTests(SimpleTestCase):
+    def test_dates(self):
+        cases = [
+            ('2024-03-04', '2024-03-04'),
+            ('Mar 4, 2024', '2024-03-04'),
+            ('13/04/2024', '2024-04-13'),  # only day-first fits
+            ('04/13/2024', '2024-04-13'),  # only month-first fits
+            ('04-13-24', '2024-04-13'),
+            ('05/05/2024', '2024-05-05'),  # same date either way
+            ('03/04/2024', '03/04/2024'),  # March 4 or 3 April: kept as written
+            ('next Tuesday', 'next Tuesday'),
+            ('  ', None),
+        ]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                self.assertEqual(normalize_date(value), expected)
+
+    def test_amounts(self):
+        cases = [
+            ('$1,250.00', 1250.0),
+            ('1.234,56', 1234.56),
+            ('1 234,56 EUR', 1234.56),
+            ('1,234,567.89', 1234567.89),
+            ('1.234.567', 1234567.0),
+            ('1,234', 1234.0),
+            ('12,50', 12.5),
+            ('1.5', 1.5),
+            ('-3.20', -3.2),
+            (12.345, 12.35),
+            ('N/A', None),
+            ('', None),
+        ]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                self.assertEqual(normalize_amount(value), expected)
+
+
+class MicroBatchingTests(SimpleTestCase):
+    def batcher(self, batch_fn, **kwargs):
+        batcher = MicroBatcher(batch_fn, name='test', **kwargs)
+        self.addCleanup(batcher.close)
+        return batcher
+
+    def test_concurrent_inputs_share_one_call(self):
+        batches = []
+        batcher = self.batcher(lambda items: batches.append(items) or [i * 2 for i in items],
+                               max_batch_size=4, max_wait_ms=2000)
+        futures = [batcher.submit(i) for i in range(4)]
+        self.assertEqual([f.result(timeout=5) for f in futures], [0, 2, 4, 6])
+        self.assertEqual(batches, [[0, 1, 2, 3]])
+
+    def test_errors_reach_every_waiter(self):
+        def fail(items):
+            raise ValueError('model failed')
+
+        for batch_fn in (fail, lambda items: items[:1]):
+            batcher = self.batcher(batch_fn, max_batch_size=3, max_wait_ms=2000)
+            futures = [batcher.submit(i) for i in range(3)]
+            for future in futures:
+                with self.assertRaises((ValueError, RuntimeError)):
+                    future.result(timeout=5)
+
+    def test_close_fails_waiting_inputs_and_refuses_new_ones(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow(items):
+            started.set()
+            release.wait(5)
+            return items
+
+        batcher = self.batcher(slow, max_batch_size=1)
+        running = batcher.submit('running')
+        self.assertTrue(started.wait(5))
+        waiting = batcher.submit('waiting')
+        batcher.close()
+        with self.assertRaises(RuntimeError):
+            waiting.result(timeout=5)
+        with self.assertRaises(RuntimeError):
+            batcher.submit('late')
+        release.set()
+        self.assertEqual(running.result(timeout=5), 'running')
+
+    def test_batched_pipeline_groups_by_kwargs(self):
+        calls = []
+
+        def pipeline(inputs, **kwargs):
+            calls.append((inputs, kwargs))
+            return [f"{text}:{kwargs.get('mode')}" for text in inputs] if isinstance(inputs, list) else f"{inputs}!"
+
+        pipeline.task = 'token-classification'
+        batched = BatchedPipeline(pipeline, 'test', max_batch_size=3, max_wait_ms=2000)
+        self.addCleanup(batched.close)
+        futures = [batched._batcher.submit(item) for item in [('a', {'mode': 1}), ('b', {}), ('c', {'mode': 1})]]
+        self.assertEqual([f.result(timeout=5) for f in futures], ['a:1', 'b!', 'c:1'])
+        self.assertIn((['a', 'c'], {'mode': 1, 'batch_size': 2}), calls)
+
+    def test_enable_and_disable_batching(self):
+        qa = lambda inputs: inputs
+        processor = DocumentProcessor(models={'qa': qa, 'invoice': None})
+        with override_settings(INFERENCE_BATCHING={'pipelines': {'qa': {'enabled': False}}}):
+            self.assertIs(enable_batching(processor).models['qa'], qa)
+        enable_batching(processor, max_batch_size=4)
+        wrapped = processor.models['qa']
+        self.assertIsInstance(wrapped, BatchedPipeline)
+        self.assertIsNone(processor.models['invoice'])
+        self.assertIs(enable_batching(processor).models['qa'], wrapped)
+        self.assertEqual(wrapped('x'), 'x')
+
+        self.assertIs(disable_batching(processor).models['qa'], qa)
+        with self.assertRaises(RuntimeError):
+            wrapped._batcher.submit(('x', {}))
+
+
+class InferenceServerTests(SimpleTestCase):
+    TEXT = 'Acme Supplies\nInvoice INV-7\nDate: 2024-01-15\nTotal: $120.50\n'
+
+    def setUp(self):
+        self.processor = DocumentProcessor(models=benchmark.stub_models())
+        server = InferenceServer(('127.0.0.1', 0), self.processor)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f"http://127.0.0.1:{server.server_address[1]}"
+        self.remote = RemoteProcessor(self.url, timeout=5)
+
+    def test_round_trip_matches_local_processor(self):
+        self.assertEqual(self.remote.process_invoice(self.TEXT), self.processor.process_invoice(self.TEXT))
+        questions = ['What is the total?', 'Who is the vendor?']
+        self.assertEqual(self.remote.answer_questions(self.TEXT, questions),
+                         self.processor.answer_questions(self.TEXT, questions))
+
+    def test_error_statuses(self):
+        with self.assertRaises(InferenceUnavailable) as raised:
+            self.remote._call('load_models')
+        self.assertEqual(raised.exception.status, 404)
+        with self.assertRaises(InferenceUnavailable) as raised:
+            self.remote._call('answer_question', text=self.TEXT)
+        self.assertEqual(raised.exception.status, 400)
+        with mock.patch.object(self.processor, 'answer_question', side_effect=ValueError('model exploded')):
+            with self.assertRaises(InferenceUnavailable) as raised:
+                self.remote.answer_question(self.TEXT, 'Total?')
+        self.assertEqual(raised.exception.status, 500)
+        self.assertIn('model exploded', str(raised.exception))
+
+    def test_timeout_and_unreachable_server(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with mock.patch.object(self.processor, 'answer_question', side_effect=lambda *args: release.wait(5)):
+            started = time.monotonic()
+            with self.assertRaises(InferenceUnavailable) as raised:
+                RemoteProcessor(self.url, timeout=0.2).answer_question(self.TEXT, 'Total?')
+        self.assertLess(time.monotonic() - started, 4)
+        self.assertIsNone(raised.exception.status)
+        with self.assertRaises(InferenceUnavailable):
+            RemoteProcessor('http://127.0.0.1:9', timeout=1).answer_question(self.TEXT, 'Total?')
+
+
+class LazyExtractionTests(TestCase):
+    """Fields read from part of a document must equal those read from all of it."""
+
+    FIXTURES = {
+        'invoice': [
+            # The labelled total is on page 1; a later page only has a smaller $ amount.
+            ['Acme Supplies\nInvoice INV-1\nTotal: $500.00\n', 'Late fee $25\n'],
+            # A bare "#123" on page 1 loses to "Invoice INV-9" on page 2.
+            ['Acme Supplies\nRef #123\n', 'Invoice INV-9 dated 03/15/2024\n', 'Amount: $40\n'],
+            # Page 1 is too short to hold the vendor line.
+            ['2024 / 17\n', 'Acme Supplies\nInvoice INV-3\nTotal: $12.50\n'],
+            ['Acme Supplies\nInvoice:\n', 'INV-4\nTotal:\n', '$75.00\n'],
+        ],
+        'resume': [
+            ['Jane Doe\n(555) 123-4567\n', 'jane@example.com 555-987-6543\nPython, Django\n'],
+            ['Jane\n', 'Doe Smith\nExperience\n'],
+        ],
+        'research_paper': [
+            ['Sparse Routing for Transformers\nAbstract: first\n', 'part continues here\n\nKeywords: moe, routing\n\nIntroduction\n'],
+            ['Title Page Only\n', 'Abstract\nShort.\n\nMethods\nResults\n', 'Discussion\nMore text\n'],
+            # The tenth section header carries on at the top of page 2.
+            ['Paper\n' + ''.join(f'Section {chr(65 + i)}\n{i}.\n' for i in range(9)) + 'Section J\n',
+             'Continued heading\n10.\nSection K\n'],
+        ],
+    }
+
+    def assert_lazy_matches_full(self, document_type, pdf):
+        processor = DocumentProcessor(models={})
+        process = getattr(processor, f'process_{document_type}')
+        with DocumentPages(pdf) as pages:
+            lazy = process(pages).model_dump()
+        self.assertEqual(lazy, process(extract_text(pdf)).model_dump())
+
+    def test_fields_spanning_pages(self):
+        for document_type, fixtures in self.FIXTURES.items():
+            for texts in fixtures:
+                with self.subTest(document_type=document_type, texts=texts):
+                    self.assert_lazy_matches_full(document_type, benchmark.pdf_from_pages(texts))
+
+    def test_generated_documents(self):
+        for document_type in benchmark.DOCUMENT_TYPES:
+            for seed in range(3):
+                with self.subTest(document_type=document_type, seed=seed):
+                    self.assert_lazy_matches_full(document_type, benchmark.generate_pdf(document_type, 6, seed=seed))
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        self.storage = ShardedFileSystemStorage(location=location)
+
+    def test_same_content_saved_concurrently(self):
+        """The upload that loses the exists() race must not retry the same name forever."""
+        name = 'documents/ab/cd/abcd.pdf'
+        self.assertEqual(self.storage.save(name, ContentFile(b'%PDF-1 first')), name)
+
+        results = []
+        with mock.patch.object(ShardedFileSystemStorage, 'exists', return_value=False):
+            worker = threading.Thread(
+                target=lambda: results.append(self.storage.save(name, ContentFile(b'%PDF-1 second')))
+            )
+            worker.start()
+            worker.join(timeout=5)
+        self.assertFalse(worker.is_alive(), "save() did not return")
+        self.assertEqual(results, [name])
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'%PDF-1 first')
+        self.assertEqual(sorted(p.name for p in Path(self.storage.path('documents/ab/cd')).iterdir()), ['abcd.pdf'])
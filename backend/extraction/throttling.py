@@ -0,0 +1,186 @@
+"""
+Cost-aware per-user quotas.
+
+Every authenticated user has a token bucket (a QuotaBucket row) holding up
+to EXTRACTION_QUOTA['capacity'] cost units, refilled continuously at
+'refill_per_second'. Requests are charged what they cost to serve, from
+settings.EXTRACTION_COSTS, so a custom LLM extraction drains the bucket far
+faster than a regex invoice. Refill and charge happen in one conditional
+UPDATE, so concurrent requests in any number of workers cannot overspend.
+
+The charge is taken before the view runs, so a user who is out of quota is
+refused before any work is done, and given back (refund_unserved) when the
+request turns out to be invalid or the server is too busy to serve it.
+The async views (async_views.py) charge once the request has validated,
+and refund the same way.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import QUOTA_REJECTIONS
+from .models import Document, QuotaBucket, UploadSession
+
+
+def extraction_cost(document_type):
+    costs = settings.EXTRACTION_COSTS
+    return costs.get(document_type, costs['auto'])
+
+
+def question_cost(count):
+    return settings.EXTRACTION_COSTS['question'] * max(1, count)
+
+
+def _quota():
+    return float(settings.EXTRACTION_QUOTA['capacity']), float(settings.EXTRACTION_QUOTA['refill_per_second'])
+
+
+def _take(user_id, cost, now, capacity, rate):
+    """Refill and charge the bucket in one statement; False if it holds too little."""
+    available = Least(
+        Value(capacity),
+        F('tokens') + Greatest(Value(now) - F('refilled_at'), Value(0.0)) * Value(rate)
+    )
+    return QuotaBucket.objects.filter(
+        GreaterThanOrEqual(available, Value(cost)), user_id=user_id
+    ).update(tokens=available - Value(cost), refilled_at=Value(now)) == 1
+
+
+def consume(user_id, cost):
+    """
+    Take `cost` units from the user's bucket. Returns 0 if the request may
+    go ahead, otherwise the seconds until the bucket will hold enough.
+    """
+    capacity, rate = _quota()
+    # A request dearer than the whole bucket can still run from a full one.
+    cost = min(float(cost), capacity)
+    now = time.time()
+    if _take(user_id, cost, now, capacity, rate):
+        return 0
+    bucket, created = QuotaBucket.objects.get_or_create(
+        user_id=user_id, defaults={'tokens': capacity, 'refilled_at': now}
+    )
+    if created and _take(user_id, cost, now, capacity, rate):
+        return 0
+    tokens = min(capacity, bucket.tokens + max(0.0, now - bucket.refilled_at) * rate)
+    # At least one unit's refill: 0 would mean go ahead, and a concurrent
+    # refund may have left enough since the UPDATE.
+    return max(cost - tokens, 1.0) / rate
+
+
+def refund(user_id, cost):
+    """Give back `cost` units charged for a request that was not served."""
+    capacity, _ = _quota()
+    QuotaBucket.objects.filter(user_id=user_id).update(
+        tokens=Least(Value(capacity), F('tokens') + Value(min(float(cost), capacity)))
+    )
+
+
+def charge(user, endpoint, cost):
+    """consume() for `user`, counting refusals; anonymous requests are not charged."""
+    if not user or not user.is_authenticated:
+        return 0
+    wait = consume(user.pk, cost)
+    if wait:
+        QUOTA_REJECTIONS.inc(endpoint=endpoint)
+    return wait
+
+
+def is_unserved(status_code):
+    """Responses that do not use up quota: client errors and 503 busy."""
+    return 400 <= status_code < 500 or status_code == 503
+
+
+def refund_unserved(view):
+    """
+    Decorate a DRF function view (inside @throttle_classes) to refund the
+    CostThrottle charge when the view rejects the request or is too busy.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        try:
+            response = view(request, *args, **kwargs)
+        except APIException as e:
+            if is_unserved(e.status_code):
+                _refund_request(request)
+            raise
+        if is_unserved(response.status_code):
+            _refund_request(request)
+        return response
+    return wrapped
+
+
+def _refund_request(request):
+    charged = getattr(request, 'quota_charge', None)
+    if charged:
+        refund(*charged)
+        request.quota_charge = None
+
+
+class CostThrottle(BaseThrottle):
+    """Charge each request get_cost() units from the user's bucket."""
+    endpoint = None
+
+    def get_cost(self, request, view):
+        return 1
+
+    def allow_request(self, request, view):
+        cost = self.get_cost(request, view)
+        self.wait_seconds = charge(request.user, self.endpoint, cost)
+        if not self.wait_seconds and request.user and request.user.is_authenticated:
+            request.quota_charge = (request.user.pk, cost)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class ExtractionThrottle(CostThrottle):
+    endpoint = 'extract'
+
+    def get_cost(self, request, view):
+        return extraction_cost(request.data.get('document_type'))
+
+
+class FinalizeUploadThrottle(CostThrottle):
+    """Chunked uploads are charged when finalized, by the type chosen at init."""
+    endpoint = 'finalize'
+
+    def get_cost(self, request, view):
+        document_type = UploadSession.objects.filter(
+            id=view.kwargs.get('upload_id'), user=request.user
+        ).values_list('document_type', flat=True).first()
+        return extraction_cost(document_type) if document_type else 0
+
+
+class ReextractionThrottle(CostThrottle):
+    """Re-extraction costs the same as extracting as the requested (or current) type."""
+    endpoint = 'reextract'
+
+    def get_cost(self, request, view):
+        document_type = request.data.get('document_type') or Document.objects.filter(
+            id=view.kwargs.get('document_id'), user=request.user
+        ).values_list('document_type', flat=True).first()
+        return extraction_cost(document_type) if document_type else 0
+
+
+class QuestionThrottle(CostThrottle):
+    endpoint = 'ask'
+
+    def get_cost(self, request, view):
+        questions = request.data.get('questions')
+        count = len(questions) if isinstance(questions, list) else 1
+        return question_cost(min(count, settings.MAX_QUESTIONS_PER_REQUEST))
+
+
+class ExportThrottle(CostThrottle):
+    endpoint = 'export'
+
+    def get_cost(self, request, view):
+        return settings.EXTRACTION_COSTS['export']
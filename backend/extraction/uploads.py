@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF-'
+READ_BLOCK_SIZE = 64 * 1024
+
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def staging_path(session) -> Path:
+    return Path(settings.UPLOAD_STAGING_DIR) / f"{session.id}.part"
+
+
+def validate_upload_init(filename: str, total_size: int):
+    if not filename.lower().endswith('.pdf'):
+        raise UploadError('Only PDF files are supported')
+    if total_size <= 0:
+        raise UploadError('total_size must be a positive number of bytes')
+    if total_size > settings.MAX_UPLOAD_SIZE:
+        raise UploadError(
+            f'File exceeds the maximum upload size of {settings.MAX_UPLOAD_SIZE} bytes',
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+
+def _lock(session):
+    """Reload `session` with its row locked until the surrounding transaction ends."""
+    from .models import UploadSession
+
+    session.refresh_from_db(from_queryset=UploadSession.objects.select_for_update())
+
+
+def append_chunk(session, stream, offset: int, content_length: int) -> int:
+    """
+    Stream one chunk from `stream` onto the staged file. The session row is
+    locked while the chunk is written, so concurrent PUTs at the same offset
+    cannot both append. Returns the new number of received bytes.
+    """
+    with transaction.atomic():
+        _lock(session)
+        return _append_locked(session, stream, offset, content_length)
+
+
+def _append_locked(session, stream, offset, content_length):
+    if session.completed:
+        raise UploadError('Upload has already been finalized', status.HTTP_409_CONFLICT)
+    if offset != session.received_size:
+        raise UploadError(
+            f'Chunk offset {offset} does not match received size {session.received_size}',
+            status.HTTP_409_CONFLICT
+        )
+    if content_length > settings.UPLOAD_CHUNK_SIZE:
+        raise UploadError(
+            f'Chunk exceeds the maximum chunk size of {settings.UPLOAD_CHUNK_SIZE} bytes',
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    if offset + content_length > session.total_size:
+        raise UploadError('Chunk extends past the declared file size', status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    path = staging_path(session)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    received = offset
+    # The magic bytes may straddle chunks, so re-read what is already staged.
+    head = b''
+    if 0 < offset < len(PDF_MAGIC):
+        with open(path, 'rb') as staged:
+            head = staged.read(offset)
+
+    with open(path, 'ab') as f:
+        f.truncate(offset)
+        try:
+            remaining = content_length
+            while stream is not None and remaining > 0:
+                block = stream.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                if received < len(PDF_MAGIC):
+                    head += block[:len(PDF_MAGIC) - received]
+                    if len(head) >= len(PDF_MAGIC) and head[:len(PDF_MAGIC)] != PDF_MAGIC:
+                        raise UploadError('File is not a valid PDF')
+                f.write(block)
+                received += len(block)
+        except Exception:
+            # Drop the partial chunk so the client can retry from `offset`.
+            f.truncate(offset)
+            if offset == 0:
+                f.close()
+                os.remove(path)
+            raise
+
+    session.received_size = received
+    session.save(update_fields=['received_size', 'updated_at'])
+    return received
+
+
+def _file_sha256(path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def finalize_upload(session) -> Path:
+    """
+    Check that every byte arrived and record the content hash. The staged
+    file is hashed once here rather than chunk by chunk, since consecutive
+    chunks may land on different workers.
+    """
+    with transaction.atomic():
+        _lock(session)
+        return _finalize_locked(session)
+
+
+def _finalize_locked(session):
+    if session.completed:
+        raise UploadError('Upload has already been finalized', status.HTTP_409_CONFLICT)
+    if session.received_size != session.total_size:
+        raise UploadError(
+            f'Upload incomplete: received {session.received_size} of {session.total_size} bytes',
+            status.HTTP_409_CONFLICT
+        )
+    session.sha256 = _file_sha256(staging_path(session))
+    session.completed = True
+    session.save(update_fields=['sha256', 'completed', 'updated_at'])
+    return staging_path(session)
+
+
+def reopen_upload(session):
+    """Undo finalize_upload so the same staged upload can be finalized again."""
+    session.completed = False
+    session.save(update_fields=['completed', 'updated_at'])
+
+
+def discard_upload(session):
+    path = staging_path(session)
+    if path.exists():
+        os.remove(path)
+
+
+def purge_stale_uploads(max_age=None):
+    """
+    Delete upload sessions untouched for `max_age` (default
+    settings.UPLOAD_SESSION_MAX_AGE seconds) with their staged files.
+    Returns the number of sessions removed.
+    """
+    from .models import UploadSession
+
+    if max_age is None:
+        max_age = timedelta(seconds=settings.UPLOAD_SESSION_MAX_AGE)
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - max_age)
+    count = 0
+    for session in stale:
+        discard_upload(session)
+        session.delete()
+        count += 1
+    return count
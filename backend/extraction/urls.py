@@ -1,6 +1,6 @@
 
 from django.urls import path
-from . import views
+from . import async_views, views
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -16,6 +16,18 @@ urlpatterns = [
     path('logout/', TokenBlacklistView.as_view(), name='token_blacklist'),
     path('extract/', views.extract_document, name='extract_document'),
     path('documents/', views.get_documents, name='get_documents'),
+    path('documents/export/<str:export_format>/', views.export_documents, name='export_documents'),
     path('documents/<int:document_id>/', views.get_document_detail, name='get_document_detail'),
     path('documents/<int:document_id>/ask_question/', views.ask_question, name='ask_question'),
+    path('documents/<int:document_id>/ask_questions/', views.ask_questions, name='ask_questions'),
+    path('documents/<int:document_id>/reextract/', views.reextract_document, name='reextract_document'),
+    path('uploads/', views.init_upload, name='init_upload'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/finalize/', views.finalize_chunked_upload, name='finalize_upload'),
+    # Async equivalents for ASGI deployments
+    path('async/extract/', async_views.extract_document, name='async_extract_document'),
+    path('async/documents/', async_views.get_documents, name='async_get_documents'),
+    path('async/documents/<int:document_id>/', async_views.get_document_detail, name='async_get_document_detail'),
+    path('async/documents/<int:document_id>/ask_question/', async_views.ask_question, name='async_ask_question'),
+    path('async/documents/<int:document_id>/ask_questions/', async_views.ask_questions, name='async_ask_questions'),
 ]
\ No newline at end of file
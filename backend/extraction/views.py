@@ -1,24 +1,45 @@
-from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import IntegrityError
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+import hmac
 import os
 import time
 import logging
 
 from .models import Document, ExtractionResult
 from .serializers import DocumentUploadSerializer, ExtractionResultSerializer
-from .ai_processor import processor
+from .answer_cache import answer_with_cache
+from .executors import ExecutorBusy
+from .inference_client import get_processor
+from .storage import open_document_buffer
+from .throttling import (
+    ExportThrottle, ExtractionThrottle, FinalizeUploadThrottle, QuestionThrottle, ReextractionThrottle,
+    refund_unserved
+)
 
 logger = logging.getLogger(__name__)
 
+
+def _busy_response(e):
+    response = Response({
+        'success': False,
+        'message': 'Server is busy, please retry shortly'
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(e.retry_after)
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([QuestionThrottle])
+@refund_unserved
 def ask_question(request, document_id):
     """
     Answer a user question about a specific document using the QA pipeline
@@ -28,17 +49,60 @@ def ask_question(request, document_id):
         question = request.data.get('question')
         if not question:
             return Response({'success': False, 'message': 'Question is required.'}, status=status.HTTP_400_BAD_REQUEST)
-        # Extract text from the document
-        pdf_path = document.file.path
-        text = processor.extract_text_from_pdf(pdf_path)
-        # Use QA pipeline
-        result = processor.answer_question(text, question)
+        processor = get_processor()
+
+        def load_text():
+            # Extract text from the document
+            with open_document_buffer(document) as buffer:
+                return processor.extract_text_from_pdf(buffer)
+
+        # Use QA pipeline, serving repeated questions from the answer cache
+        results = answer_with_cache(processor, document, [question], load_text)
+        result = results if isinstance(results, dict) else results[0]
         return Response({'success': True, 'result': result}, status=status.HTTP_200_OK)
     except Document.DoesNotExist:
         return Response({'success': False, 'message': 'Document not found.'}, status=status.HTTP_404_NOT_FOUND)
+    except ExecutorBusy as e:
+        return _busy_response(e)
     except Exception as e:
         logger.error(f"Error in ask_question: {e}")
         return Response({'success': False, 'message': 'Error answering question.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([QuestionThrottle])
+@refund_unserved
+def ask_questions(request, document_id):
+    """
+    Answer a list of questions about one document in a single batched QA pass
+    """
+    try:
+        document = Document.objects.get(id=document_id, user=request.user)
+        questions = request.data.get('questions')
+        if (not isinstance(questions, list) or not questions
+                or not all(isinstance(q, str) and q.strip() for q in questions)):
+            return Response({'success': False, 'message': 'questions must be a non-empty list of strings.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(questions) > settings.MAX_QUESTIONS_PER_REQUEST:
+            return Response({'success': False, 'message': f'At most {settings.MAX_QUESTIONS_PER_REQUEST} questions per request.'}, status=status.HTTP_400_BAD_REQUEST)
+        processor = get_processor()
+
+        def load_text():
+            with open_document_buffer(document) as buffer:
+                return processor.extract_text_from_pdf(buffer)
+
+        results = answer_with_cache(processor, document, [q.strip() for q in questions], load_text)
+        if isinstance(results, dict) and 'error' in results:
+            logger.error(f"Error in ask_questions: {results['error']}")
+            return Response({'success': False, 'message': 'Error answering questions.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'success': True, 'results': results}, status=status.HTTP_200_OK)
+    except Document.DoesNotExist:
+        return Response({'success': False, 'message': 'Document not found.'}, status=status.HTTP_404_NOT_FOUND)
+    except ExecutorBusy as e:
+        return _busy_response(e)
+    except Exception as e:
+        logger.error(f"Error in ask_questions: {e}")
+        return Response({'success': False, 'message': 'Error answering questions.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 from django.contrib.auth.models import User
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
@@ -66,24 +130,49 @@ def register(request):
     except Exception as e:
         return Response({'success': False, 'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 from rest_framework import status
-from rest_framework.decorators import api_view, parser_classes
+from rest_framework.decorators import api_view, parser_classes, throttle_classes
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.files import File
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+import datetime
 import os
 import time
 import logging
 
-from .models import Document, ExtractionResult
-from .serializers import DocumentUploadSerializer, ExtractionResultSerializer
-from .ai_processor import processor
+from .models import Document, ExtractionResult, UploadSession
+from .serializers import DocumentUploadSerializer, ExtractionResultSerializer, ReextractSerializer, UploadInitSerializer
+from .export import ExportError, export_stream
+from .metrics import render_metrics
+from .response_cache import cached_payload, not_modified, with_validators
+from .pipeline import ExtractionError, extract_upload, run_extraction
+from .uploads import UploadError, append_chunk, discard_upload, finalize_upload, reopen_upload, validate_upload_init
 
 logger = logging.getLogger(__name__)
 
 
+def _extraction_response(document, result):
+    return {
+        'success': True,
+        'document_id': document.id,
+        'document_type': document.document_type,
+        'extracted_data': result.extracted_data,
+        'processing_time': result.processing_time,
+        'stage_timings': result.stage_timings,
+        'classification': result.classification,
+        'message': 'Document processed successfully'
+    }
+
+
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
+@throttle_classes([ExtractionThrottle])
+@refund_unserved
 def extract_document(request):
     """
     API endpoint to upload and extract data from documents
@@ -109,72 +198,30 @@ def extract_document(request):
                 'message': 'Only PDF files are supported'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Save document to database
-        document = Document.objects.create(
-            user=request.user,
-            title=title,
-            file=file,
-            document_type=document_type,
-            custom_prompt=custom_prompt if document_type == 'other' else None
-        )
-        
-        # Process the document
-        start_time = time.time()
-        
         try:
-            # Extract text from PDF
-            file_path = document.file.path
-            text = processor.extract_text_from_pdf(file_path)
-            
-            if not text.strip():
-                return Response({
-                    'success': False,
-                    'message': 'Could not extract text from PDF'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Process based on document type
-            if document_type == 'invoice':
-                extracted_data = processor.process_invoice(text)
-            elif document_type == 'resume':
-                extracted_data = processor.process_resume(text)
-            elif document_type == 'research_paper':
-                extracted_data = processor.process_research_paper(text)
-            elif document_type == 'other':
-                extracted_data = processor.process_custom(text, custom_prompt)
-            else:
-                return Response({
-                    'success': False,
-                    'message': 'Invalid document type'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            processing_time = time.time() - start_time
-            
-            # Save extraction result
-            result = ExtractionResult.objects.create(
-                document=document,
-                extracted_data=extracted_data,
-                processing_time=processing_time
+            # Parse the received bytes while the document is persisted
+            document, result = extract_upload(
+                file,
+                user=request.user,
+                title=title,
+                document_type=document_type,
+                custom_prompt=custom_prompt if document_type == 'other' else None
             )
-            
-            # Mark document as processed
-            document.processed = True
-            document.save()
-            
+        except ExtractionError as e:
             return Response({
-                'success': True,
-                'document_id': document.id,
-                'document_type': document_type,
-                'extracted_data': extracted_data,
-                'processing_time': processing_time,
-                'message': 'Document processed successfully'
-            }, status=status.HTTP_200_OK)
-            
+                'success': False,
+                'message': e.message
+            }, status=e.status_code)
+        except ExecutorBusy as e:
+            return _busy_response(e)
         except Exception as e:
             logger.error(f"Error processing document: {e}")
             return Response({
                 'success': False,
                 'message': f'Error processing document: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response(_extraction_response(document, result), status=status.HTTP_200_OK)
     
     except Exception as e:
         logger.error(f"Error in extract_document view: {e}")
@@ -184,34 +231,59 @@ def extract_document(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _document_summary(doc):
+    data = {
+        'id': doc.id,
+        'title': doc.title,
+        'document_type': doc.document_type,
+        'uploaded_at': doc.uploaded_at,
+        'processed': doc.processed
+    }
+    if hasattr(doc, 'result'):
+        data['extracted_data'] = doc.result.extracted_data
+        data['processing_time'] = doc.result.processing_time
+    return data
+
+
+def _document_detail(document):
+    data = {
+        'id': document.id,
+        'title': document.title,
+        'document_type': document.document_type,
+        'custom_prompt': document.custom_prompt,
+        'uploaded_at': document.uploaded_at,
+        'processed': document.processed
+    }
+    if hasattr(document, 'result'):
+        data['extracted_data'] = document.result.extracted_data
+        data['processing_time'] = document.result.processing_time
+        data['stage_timings'] = document.result.stage_timings
+        data['classification'] = document.result.classification
+        data['created_at'] = document.result.created_at
+    return data
+
+
 @api_view(['GET'])
 def get_documents(request):
     """
     Get list of all uploaded documents
     """
     try:
-        documents = Document.objects.filter(user=request.user).order_by('-uploaded_at')
-        data = []
-        
-        for doc in documents:
-            doc_data = {
-                'id': doc.id,
-                'title': doc.title,
-                'document_type': doc.document_type,
-                'uploaded_at': doc.uploaded_at,
-                'processed': doc.processed
-            }
-            
-            if hasattr(doc, 'result'):
-                doc_data['extracted_data'] = doc.result.extracted_data
-                doc_data['processing_time'] = doc.result.processing_time
-            
-            data.append(doc_data)
-        
-        return Response({
+        def build():
+            documents = Document.objects.filter(user=request.user).select_related('result').order_by('-uploaded_at')
+            return [_document_summary(doc) for doc in documents]
+
+        data, etag, last_modified = cached_payload(
+            'document_list', 'documents', request.user.id, build, user_id=request.user.id
+        )
+        cached = not_modified(request, etag, last_modified)
+        if cached is not None:
+            return cached
+
+        return with_validators(Response({
             'success': True,
             'documents': data
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK), etag, last_modified)
     
     except Exception as e:
         logger.error(f"Error getting documents: {e}")
@@ -227,26 +299,22 @@ def get_document_detail(request, document_id):
     Get detailed information about a specific document
     """
     try:
-        document = Document.objects.get(id=document_id, user=request.user)
-        
-        data = {
-            'id': document.id,
-            'title': document.title,
-            'document_type': document.document_type,
-            'custom_prompt': document.custom_prompt,
-            'uploaded_at': document.uploaded_at,
-            'processed': document.processed
-        }
-        
-        if hasattr(document, 'result'):
-            data['extracted_data'] = document.result.extracted_data
-            data['processing_time'] = document.result.processing_time
-            data['created_at'] = document.result.created_at
-        
-        return Response({
+        def build():
+            return _document_detail(
+                Document.objects.select_related('result').get(id=document_id, user=request.user)
+            )
+
+        data, etag, last_modified = cached_payload(
+            'document_detail', 'document', document_id, build, user_id=request.user.id
+        )
+        cached = not_modified(request, etag, last_modified)
+        if cached is not None:
+            return cached
+
+        return with_validators(Response({
             'success': True,
             'document': data
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK), etag, last_modified)
     
     except Document.DoesNotExist:
         return Response({
@@ -259,4 +327,254 @@ def get_document_detail(request, document_id):
         return Response({
             'success': False,
             'message': 'Error retrieving document details'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _upload_status(session):
+    return {
+        'upload_id': str(session.id),
+        'filename': session.filename,
+        'total_size': session.total_size,
+        'received_size': session.received_size,
+        'chunk_size': settings.UPLOAD_CHUNK_SIZE,
+        'completed': session.completed
+    }
+
+
+@api_view(['POST'])
+def init_upload(request):
+    """
+    Start a resumable chunked upload. Chunks are then sent with
+    PUT /uploads/<upload_id>/ and the upload is completed with
+    POST /uploads/<upload_id>/finalize/
+    """
+    serializer = UploadInitSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    try:
+        validate_upload_init(data['filename'], data['total_size'])
+    except UploadError as e:
+        return Response({'success': False, 'message': e.message}, status=e.status_code)
+
+    session = UploadSession.objects.create(
+        user=request.user,
+        filename=data['filename'],
+        title=data.get('title', data['filename']),
+        document_type=data['document_type'],
+        custom_prompt=data.get('custom_prompt') if data['document_type'] == 'other' else None,
+        total_size=data['total_size']
+    )
+    return Response({'success': True, **_upload_status(session)}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@parser_classes([])
+def upload_chunk(request, upload_id):
+    """
+    GET reports how many bytes have been received so an interrupted upload can
+    resume. PUT appends the raw request body at the `Upload-Offset` header.
+    DELETE abandons the upload.
+    """
+    try:
+        session = UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return Response({'success': False, 'message': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        return Response({'success': True, **_upload_status(session)}, status=status.HTTP_200_OK)
+
+    if request.method == 'DELETE':
+        discard_upload(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', session.received_size))
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'Upload-Offset and Content-Length must be integers'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Read from the raw WSGI stream so the chunk is never buffered whole.
+        append_chunk(session, request.stream, offset, content_length)
+    except UploadError as e:
+        if session.received_size == 0 and e.status_code == status.HTTP_400_BAD_REQUEST:
+            session.delete()
+        return Response({'success': False, 'message': e.message}, status=e.status_code)
+    except Exception as e:
+        logger.error(f"Error appending upload chunk: {e}")
+        return Response({
+            'success': False,
+            'message': 'Error storing upload chunk'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return Response({'success': True, **_upload_status(session)}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@throttle_classes([FinalizeUploadThrottle])
+@refund_unserved
+def finalize_chunked_upload(request, upload_id):
+    """
+    Complete a chunked upload: store the PDF as a Document and extract it
+    """
+    try:
+        session = UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return Response({'success': False, 'message': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        staged_path = finalize_upload(session)
+    except UploadError as e:
+        return Response({'success': False, 'message': e.message}, status=e.status_code)
+
+    keep_staged = False
+    try:
+        with open(staged_path, 'rb') as staged:
+            document, result = extract_upload(
+                File(staged, name=session.filename),
+                user=request.user,
+                title=session.title or session.filename,
+                document_type=session.document_type,
+                custom_prompt=session.custom_prompt,
+                sha256=session.sha256
+            )
+    except ExtractionError as e:
+        return Response({'success': False, 'message': e.message}, status=e.status_code)
+    except ExecutorBusy as e:
+        # Nothing was stored yet; keep the staged bytes so the client can retry.
+        keep_staged = True
+        reopen_upload(session)
+        return _busy_response(e)
+    except Exception as e:
+        logger.error(f"Error processing document: {e}")
+        return Response({
+            'success': False,
+            'message': f'Error processing document: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    finally:
+        if not keep_staged:
+            discard_upload(session)
+            session.delete()
+
+    return Response(_extraction_response(document, result), status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@throttle_classes([ReextractionThrottle])
+@refund_unserved
+def reextract_document(request, document_id):
+    """
+    Extract a stored document again, optionally as a different type, and
+    replace its result
+    """
+    try:
+        document = Document.objects.get(id=document_id, user=request.user)
+    except Document.DoesNotExist:
+        return Response({'success': False, 'message': 'Document not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    serializer = ReextractSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({'success': False, 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    document.document_type = serializer.validated_data.get('document_type', document.document_type)
+    if document.document_type == 'other':
+        document.custom_prompt = serializer.validated_data.get('custom_prompt', document.custom_prompt)
+    classification = ExtractionResult.objects.filter(document=document).values_list(
+        'classification', flat=True
+    ).first()
+    if classification and classification.get('document_type') != document.document_type:
+        # Re-extracted as a type the user chose, not the detected one.
+        classification = {key: value for key, value in classification.items() if key != 'auto'}
+
+    try:
+        result = run_extraction(document, classification=classification)
+    except ExtractionError as e:
+        return Response({'success': False, 'message': e.message}, status=e.status_code)
+    except ExecutorBusy as e:
+        return _busy_response(e)
+    except Exception as e:
+        logger.error(f"Error re-extracting document: {e}")
+        return Response({
+            'success': False,
+            'message': f'Error processing document: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return Response(_extraction_response(document, result), status=status.HTTP_200_OK)
+
+
+def _parse_export_date(value, end_of_day=False):
+    """
+    Aware datetime for a since/until filter. A bare date means midnight in
+    the server timezone; with `end_of_day` it means the next midnight, so an
+    exclusive `until` still covers that whole day.
+    """
+    if not value:
+        return None
+    try:
+        # parse_datetime() also accepts a bare date, so check for one first.
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.datetime.combine(day, datetime.time.min)
+            if end_of_day:
+                parsed += datetime.timedelta(days=1)
+        else:
+            parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ExportError(f"Invalid date '{value}', expected YYYY-MM-DD or an ISO 8601 datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+@api_view(['GET'])
+@throttle_classes([ExportThrottle])
+@refund_unserved
+def export_documents(request, export_format):
+    """
+    Stream the user's extraction results as CSV, NDJSON or Parquet.
+    Optional filters: document_type, since, until (on upload date; a
+    date-only until includes that day).
+    """
+    try:
+        content_type, extension, chunks = export_stream(
+            export_format,
+            request.user,
+            document_type=request.query_params.get('document_type'),
+            since=_parse_export_date(request.query_params.get('since')),
+            until=_parse_export_date(request.query_params.get('until'), end_of_day=True)
+        )
+    except ExportError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="documents.{extension}"'
+    return response
+
+
+def _metrics_allowed(request):
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint for this process's pipeline metrics, open to
+    METRICS_ALLOWED_IPS and to requests bearing METRICS_TOKEN
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden('Forbidden', content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
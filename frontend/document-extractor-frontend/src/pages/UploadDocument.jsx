@@ -34,6 +34,7 @@ const UploadDocument = () => {
   const navigate = useNavigate();
 
   const documentTypes = [
+    { value: 'auto', label: 'Auto-detect' },
     { value: 'invoice', label: 'Invoice' },
     { value: 'resume', label: 'Resume' },
     { value: 'research_paper', label: 'Research Paper' },
@@ -347,6 +348,16 @@ const UploadDocument = () => {
                   <h4 className="font-medium mb-2">Document Information</h4>
                   <div className="space-y-1 text-sm">
                     <p><strong>Type:</strong> {result.document_type}</p>
+                    {result.classification?.auto && (
+                      <p className="text-gray-600">
+                        Auto-detected ({Math.round(result.classification.confidence * 100)}% confidence)
+                      </p>
+                    )}
+                    {!result.classification?.auto && result.classification?.confident && result.classification.document_type !== result.document_type && (
+                      <p className="text-amber-600">
+                        This looks like a {result.classification.document_type.replace('_', ' ')} ({Math.round(result.classification.confidence * 100)}% confidence). Re-upload with that type for better results.
+                      </p>
+                    )}
                     <p><strong>Processing Time:</strong> {result.processing_time?.toFixed(2)}s</p>
                   </div>
                 </div>